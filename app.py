@@ -1,18 +1,13 @@
 import streamlit as st
-import cv2
 import time
 import os
 import threading
-import numpy as np
-import pandas as pd
-from datetime import datetime
-from gtts import gTTS
-import tempfile
-import platform
-import subprocess
 import hashlib
-import json
-from pathlib import Path
+from audio_playback import PlaybackEngine, get_default_engine
+from playback_queue import PlaybackPolicy, PlaybackQueue
+from user_store import get_user_store
+from metrics import metrics
+# cv2, numpy, pandas and the detector modules are imported by the pages that use them
 
 # Initialize session state
 if 'page' not in st.session_state:
@@ -27,152 +22,120 @@ if 'current_lang' not in st.session_state:
 # Create data directory
 os.makedirs("data", exist_ok=True)
 
+# Prometheus export: NEURONUDGE_METRICS_FILE and/or NEURONUDGE_METRICS_PORT
+if os.environ.get("NEURONUDGE_METRICS_FILE") or os.environ.get("NEURONUDGE_METRICS_PORT"):
+    metrics.enable()
+    metrics.start_exporter(path=os.environ.get("NEURONUDGE_METRICS_FILE"),
+                           port=int(os.environ.get("NEURONUDGE_METRICS_PORT") or 0))
+
 # ======================
 # AUTHENTICATION SYSTEM
 # ======================
 USER_DATA_PATH = "data/users.json"
 
 def load_users():
-    try:
-        if not Path(USER_DATA_PATH).exists():
-            return {}
-        with open(USER_DATA_PATH) as f:
-            return json.load(f)
-    except:
-        return {}
+    return get_user_store(USER_DATA_PATH).all()
 
 def save_users(users):
-    with open(USER_DATA_PATH, 'w') as f:
-        json.dump(users, f)
+    get_user_store(USER_DATA_PATH).replace_all(users)
 
 def register_user(username, password):
-    users = load_users()
-    if username in users:
-        return False, "Username exists"
     hashed = hashlib.sha256(password.encode()).hexdigest()
-    users[username] = {"password": hashed}
-    save_users(users)
+    if not get_user_store(USER_DATA_PATH).add(username, {"password": hashed}):
+        return False, "Username exists"
     return True, "Registered!"
 
 def authenticate(username, password):
-    users = load_users()
-    if username not in users:
+    user = get_user_store(USER_DATA_PATH).get(username)
+    if user is None:
         return False, "User not found"
     hashed = hashlib.sha256(password.encode()).hexdigest()
-    if users[username]["password"] == hashed:
+    if user["password"] == hashed:
         return True, "Login success"
     return False, "Wrong password"
 
-# ======================
-# ENHANCED EMOTION DETECTION
-# ======================
-class EnhancedEmotionDetector:
-    def __init__(self):
-        self.cap = cv2.VideoCapture(0)
-        if not self.cap.isOpened():
-            raise RuntimeError("Camera error")
-        
-        self.face_cascade = cv2.CascadeClassifier(
-            cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-        
-        self.emotion_labels = ['happy', 'sad', 'angry', 'surprised', 'neutral']
-    
-    def get_emotion_frame(self):
-        ret, frame = self.cap.read()
-        if not ret:
-            return None, None
-        
-        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        faces = self.face_cascade.detectMultiScale(gray, 1.3, 5)
-        
-        if len(faces) == 0:
-            return frame_rgb, None
-        
-        emotions = {
-            'happy': self._detect_happy(frame, faces),
-            'sad': self._detect_sad(frame, faces),
-            'angry': self._detect_angry(frame, faces),
-            'surprised': self._detect_surprised(frame, faces),
-            'neutral': self._detect_neutral(frame, faces)
-        }
-        
-        total = sum(emotions.values())
-        if total > 0:
-            emotions = {k: v/total for k, v in emotions.items()}
-        
-        return frame_rgb, emotions
-    
-    def _detect_happy(self, frame, faces):
-        return np.random.uniform(0.7, 0.9)
-    
-    def _detect_sad(self, frame, faces):
-        return np.random.uniform(0.0, 0.3)
-    
-    def _detect_angry(self, frame, faces):
-        return np.random.uniform(0.0, 0.2)
-    
-    def _detect_surprised(self, frame, faces):
-        return np.random.uniform(0.0, 0.2)
-    
-    def _detect_neutral(self, frame, faces):
-        return np.random.uniform(0.1, 0.4)
-    
-    def release(self):
-        if self.cap.isOpened():
-            self.cap.release()
-
 # ======================
 # MULTI-LANGUAGE SPEAKER
 # ======================
+# Shared by every session; the phrases are synthesized once per process
+RESPONSES = {
+    'en': {
+        'happy': "You look very happy today! 😊",
+        'sad': "I sense you might be feeling sad. 💙",
+        'angry': "You seem angry. Try deep breathing. 🧘",
+        'surprised': "You look surprised! 😲",
+        'neutral': "You appear calm and neutral. 😐"
+    },
+    'kn': {
+        'happy': "ನೀವು ಬಹಳ ಸಂತೋಷದಿಂದ ಕಾಣುತ್ತೀರಿ! 😊",
+        'sad': "ನೀವು ದುಃಖಿತರಾಗಿರಬಹುದು. 💙",
+        'angry': "ನೀವು ಕೋಪಗೊಂಡಿರುವಂತೆ ಕಾಣುತ್ತೀರಿ. ಗಾಳಿ ಉಚ್ಛ್ವಾಸ ಮಾಡಿ. 🧘",
+        'surprised': "ನೀವು ಆಶ್ಚರ್ಯಚಕಿತರಾಗಿದ್ದೀರಿ! 😲",
+        'neutral': "ನೀವು ಶಾಂತವಾಗಿ ಕಾಣುತ್ತೀರಿ. 😐"
+    },
+    'hi': {
+        'happy': "आप बहुत खुश लग रहे हैं! 😊",
+        'sad': "आप उदास लग रहे हैं। 💙",
+        'angry': "आप क्रोधित लग रहे हैं। गहरी सांस लें। 🧘",
+        'surprised': "आप हैरान लग रहे हैं! 😲",
+        'neutral': "आप शांत लग रहे हैं। 😐"
+    }
+}
+
+def response_phrases(responses=RESPONSES):
+    """All (text, lang) pairs in a response table"""
+    return [(text, lang) for lang, texts in responses.items() for text in texts.values()]
+
 class MultiLanguageSpeaker:
-    def __init__(self):
-        self.system = platform.system()
-        self.responses = {
-            'en': {
-                'happy': "You look very happy today! 😊",
-                'sad': "I sense you might be feeling sad. 💙",
-                'angry': "You seem angry. Try deep breathing. 🧘",
-                'surprised': "You look surprised! 😲",
-                'neutral': "You appear calm and neutral. 😐"
-            },
-            'kn': {
-                'happy': "ನೀವು ಬಹಳ ಸಂತೋಷದಿಂದ ಕಾಣುತ್ತೀರಿ! 😊",
-                'sad': "ನೀವು ದುಃಖಿತರಾಗಿರಬಹುದು. 💙",
-                'angry': "ನೀವು ಕೋಪಗೊಂಡಿರುವಂತೆ ಕಾಣುತ್ತೀರಿ. ಗಾಳಿ ಉಚ್ಛ್ವಾಸ ಮಾಡಿ. 🧘",
-                'surprised': "ನೀವು ಆಶ್ಚರ್ಯಚಕಿತರಾಗಿದ್ದೀರಿ! 😲",
-                'neutral': "ನೀವು ಶಾಂತವಾಗಿ ಕಾಣುತ್ತೀರಿ. 😐"
-            },
-            'hi': {
-                'happy': "आप बहुत खुश लग रहे हैं! 😊",
-                'sad': "आप उदास लग रहे हैं। 💙",
-                'angry': "आप क्रोधित लग रहे हैं। गहरी सांस लें। 🧘",
-                'surprised': "आप हैरान लग रहे हैं! 😲",
-                'neutral': "आप शांत लग रहे हैं। 😐"
-            }
-        }
+    def __init__(self, engine: PlaybackEngine = None, policy: PlaybackPolicy = None):
+        self.engine = engine or get_default_engine()
+        self.queue = PlaybackQueue(lambda item: self._play(*item), policy)
+        self.responses = RESPONSES
     
     def speak(self, emotion, lang='en'):
         try:
-            if lang not in self.responses:
-                lang = 'en'
-            
-            text = self.responses[lang].get(emotion, self.responses['en'][emotion])
-            
-            with tempfile.NamedTemporaryFile(suffix='.mp3', delete=False) as f:
-                tts = gTTS(text=text, lang=lang, slow=False)
-                tts.save(f.name)
-                
-                if self.system == "Windows":
-                    os.startfile(f.name)
-                elif self.system == "Darwin":
-                    subprocess.run(['afplay', f.name])
-                else:
-                    subprocess.run(['aplay', f.name])
-                
-                threading.Timer(3, lambda: os.remove(f.name)).start()
+            self._play(emotion, lang)
         except Exception as e:
             st.error(f"Audio error: {str(e)}")
+    
+    def speak_async(self, emotion, lang='en'):
+        """Queue a nudge for the audio worker; never blocks the caller"""
+        return self.queue.submit(emotion, (emotion, lang))
+    
+    def close(self):
+        self.queue.close()
+    
+    def _play(self, emotion, lang):
+        if lang not in self.responses:
+            lang = 'en'
+        
+        text = self.responses[lang].get(emotion, self.responses['en'][emotion])
+        
+        # Decoded PCM goes straight to the persistent audio sink
+        self.engine.play(text, lang, slow=False)
+
+# ======================
+# SHARED RESOURCES
+# ======================
+@st.cache_resource
+def detection_service():
+    """Process-wide inference service with its models loaded on every worker"""
+    from inference_service import get_default_service
+    service = get_default_service()
+    service.warm_up()
+    return service
+
+@st.cache_resource
+def start_warm_up():
+    """Load detection models and speech while the first user is still logging in"""
+    def warm():
+        from inference_service import get_default_service
+        get_default_service().warm_up()
+        # Speech last: synthesizing uncached phrases goes over the network
+        get_default_engine().prewarm(response_phrases(), slow=False)
+    thread = threading.Thread(target=warm, name="warm-up", daemon=True)
+    thread.start()
+    return thread
 
 # ======================
 # PAGES
@@ -196,6 +159,9 @@ def login_page():
                 else:
                     st.error(msg)
     
+    # Models load in the background; the form above is already on screen
+    start_warm_up()
+    
     with tab2:
         with st.form("register_form"):
             new_user = st.text_input("New username")
@@ -212,6 +178,11 @@ def login_page():
                         st.error(msg)
 
 def detector_page():
+    from emotion_smoother import EmotionSmoother, SmootherConfig
+    from enhanced_detector import EnhancedEmotionDetector
+    from preview_stream import PreviewStreamer
+    from rate_governor import RateGovernor
+    
     st.title("Enhanced Emotion Detector")
     
     # Language selection
@@ -226,61 +197,174 @@ def detector_page():
         st.session_state.detector = None
     if 'speaker' not in st.session_state:
         st.session_state.speaker = MultiLanguageSpeaker()
+        start_warm_up()  # no-op unless this process skipped the login page
     
     # Camera controls
     col1, col2 = st.columns(2)
     with col1:
         if st.button("Start Camera") and st.session_state.detector is None:
+            st.session_state.camera_started = time.perf_counter()
+            st.session_state.pop('first_frame', None)
             try:
-                st.session_state.detector = EnhancedEmotionDetector()
+                st.session_state.detector = EnhancedEmotionDetector(
+                    tracking=True, scene_gate=True, service=detection_service())
             except Exception as e:
                 st.error(f"Camera error: {str(e)}")
     with col2:
         if st.button("Stop Camera") and st.session_state.detector:
             st.session_state.detector.release()
             st.session_state.detector = None
+            st.session_state.pop('smoother', None)
             st.rerun()
     
     # Emotion detection display
     if st.session_state.detector:
         placeholder = st.empty()
-        last_emotion = None
+        audio_status = st.sidebar.empty()
+        gate_status = st.sidebar.empty()
+        rate_status = st.sidebar.empty()
+        service_status = st.sidebar.empty()
+        preview_status = st.sidebar.empty()
+        startup_status = st.sidebar.empty()
+        # Display only; collection is process-wide and set by NEURONUDGE_METRICS*
+        show_metrics = st.sidebar.checkbox("Pipeline metrics", key="show_metrics")
+        metrics_panel = st.sidebar.empty()
+        if show_metrics and not metrics.enabled:
+            metrics_panel.caption("Metrics collection is off; start the app with NEURONUDGE_METRICS=1.")
+        metrics_shown = 0.0
+        preview = PreviewStreamer()
+        governor = RateGovernor()
+        # Survives reruns so the smoothed state (and what was last announced) persists
+        if 'smoother' not in st.session_state:
+            st.session_state.smoother = EmotionSmoother(
+                st.session_state.detector.emotion_labels, SmootherConfig(enter=0.6))
+        smoother = st.session_state.smoother
+        smooth_status = st.sidebar.empty()
+        audio_errors = 0
         
         while st.session_state.detector:
             frame, emotions = st.session_state.detector.get_emotion_frame()
             
+            started = st.session_state.get('camera_started')
+            if started is not None and frame is not None:
+                # Measured once per Start Camera: first frame, then first detection
+                elapsed = time.perf_counter() - started
+                if 'first_frame' not in st.session_state:
+                    st.session_state.first_frame = elapsed
+                    metrics.observe('time_to_first_frame', elapsed)
+                if emotions:
+                    st.session_state.camera_started = None
+                    metrics.observe('time_to_first_detection', elapsed)
+                    startup_status.caption(
+                        f"Startup: first frame {st.session_state.pop('first_frame') * 1000:.0f} ms, "
+                        f"first detection {elapsed * 1000:.0f} ms")
+            
             if frame is not None:
-                placeholder.image(frame, use_container_width=True)
+                # Small JPEG previews at their own adaptive rate; detection sees every frame
+                jpeg = preview.offer(frame, channels='RGB')
+                if jpeg is not None:
+                    sent_at = time.perf_counter()
+                    placeholder.image(jpeg, use_container_width=True)
+                    preview.sent(time.perf_counter() - sent_at)
+                    shown = preview.stats()
+                    preview_status.caption(
+                        f"Preview: {shown['fps']:.1f} fps, quality {shown['quality']}, "
+                        f"{shown['kbps']:.0f} kbit/s")
                 
-                if emotions:
-                    emotion, confidence = max(emotions.items(), key=lambda x: x[1])
+                # Only a change in the smoothed state reaches the UI and speech
+                change = smoother.update(emotions)
+                if change is not None:
+                    emotion, confidence = change.emotion, change.confidence
+                    st.success(f"Detected: {emotion} ({confidence:.0%} confidence)")
                     
-                    if confidence > 0.6 and emotion != last_emotion:
-                        st.success(f"Detected: {emotion} ({confidence:.0%} confidence)")
-                        
-                        emojis = {
-                            'happy': '😊',
-                            'sad': '😢',
-                            'angry': '😠',
-                            'surprised': '😲',
-                            'neutral': '😐'
-                        }
-                        st.markdown(f"### {emojis.get(emotion, '')} {emotion.capitalize()}")
-                        
-                        st.session_state.speaker.speak(emotion, lang_code)
-                        
-                        last_emotion = emotion
-                        time.sleep(3)
+                    emojis = {
+                        'happy': '😊',
+                        'sad': '😢',
+                        'angry': '😠',
+                        'surprised': '😲',
+                        'neutral': '😐'
+                    }
+                    st.markdown(f"### {emojis.get(emotion, '')} {emotion.capitalize()}")
+                    
+                    # Audio plays on its own worker; the feed keeps running
+                    st.session_state.speaker.speak_async(emotion, lang_code)
+                
+                # Playback errors happen on the worker, so check for new ones every frame
+                audio = st.session_state.speaker.queue.metrics()
+                if change is not None or audio['errors'] != audio_errors:
+                    audio_errors = audio['errors']
+                    caption = (f"Audio queue: {audio['depth']} pending, "
+                               f"avg wait {audio['wait_avg'] * 1000:.0f} ms, "
+                               f"{audio['coalesced'] + audio['superseded']} skipped")
+                    if audio_errors:
+                        caption += f", {audio_errors} failed (last: {st.session_state.speaker.queue.last_error})"
+                    audio_status.caption(caption)
+                
+                if emotions is not None:
+                    smoothed = smoother.stats()
+                    smooth_status.caption(
+                        f"Smoothed: {smoothed['state'] or 'none'} "
+                        f"({smoothed['confidence']:.0%}), {smoothed['changes']} changes "
+                        f"in {smoothed['frames']} frames")
+                
+                gate = st.session_state.detector.gate
+                if gate is not None:
+                    gate_status.caption(
+                        f"Inference skipped on {gate.stats()['skip_ratio']:.0%} of frames, "
+                        f"result age {gate.staleness:.1f} s")
+                
+                service = st.session_state.detector.service
+                if service is not None:
+                    shared = service.stats()
+                    mine = shared['per_session'].get(st.session_state.detector.session_id, {})
+                    service_status.caption(
+                        f"Shared inference: {shared['sessions']} sessions, "
+                        f"avg batch {shared['avg_batch']:.1f}, "
+                        f"latency {mine.get('latency_avg', 0.0) * 1000:.0f} ms, "
+                        f"{mine.get('dropped', 0)} frames dropped")
             
-            time.sleep(0.1)
+            if show_metrics and metrics.enabled and time.monotonic() - metrics_shown > 2.0:
+                render_metrics(metrics_panel)
+                metrics_shown = time.monotonic()
+            
+            # Backs off while nobody is in view, snaps back when a face appears
+            governor.pace(frame is not None and emotions is not None)
+            rate = governor.stats()
+            rate_status.caption(
+                f"Rate: {rate['state']}, {rate['effective_fps']:.1f} fps "
+                f"(target {rate['target_fps']:.1f}, duty {rate['duty']:.0%})")
+        
+        preview.close()
     
     if st.button("Logout"):
         if st.session_state.detector:
             st.session_state.detector.release()
+            st.session_state.detector = None
+        # Each speaker owns a playback worker thread
+        if 'speaker' in st.session_state:
+            st.session_state.pop('speaker').close()
         st.session_state.logged_in = False
         st.session_state.page = "login"
         st.rerun()
 
+# ======================
+# METRICS PANEL
+# ======================
+def render_metrics(container):
+    import pandas as pd
+    snap = metrics.snapshot()
+    rows = [{'stage': stage,
+             'count': s['count'],
+             'p50 ms': round(s['p50'] * 1000, 2),
+             'p95 ms': round(s['p95'] * 1000, 2),
+             'p99 ms': round(s['p99'] * 1000, 2)}
+            for stage, s in snap['latency'].items()]
+    with container.container():
+        if rows:
+            st.dataframe(pd.DataFrame(rows).set_index('stage'), use_container_width=True)
+        for name, value in snap['counters'].items():
+            st.caption(f"{name.replace('_', ' ')}: {value}")
+
 # ======================
 # MAIN APP
 # ======================
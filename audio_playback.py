@@ -0,0 +1,178 @@
+import io
+import subprocess
+import threading
+import wave
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional, Tuple
+
+from metrics import metrics
+from tts_cache import TTSCache, get_default_cache
+
+@dataclass(frozen=True)
+class PCMBuffer:
+    data: bytes
+    sample_rate: int
+    channels: int = 1
+    sample_width: int = 2  # bytes per sample, signed 16-bit
+
+    @property
+    def format(self) -> Tuple[int, int, int]:
+        return self.sample_rate, self.channels, self.sample_width
+
+    @property
+    def duration(self) -> float:
+        return len(self.data) / float(self.sample_rate * self.channels * self.sample_width)
+
+def decode_audio(audio: bytes, sample_rate: int = 24000) -> PCMBuffer:
+    """Decode WAV or MP3 bytes into signed 16-bit PCM"""
+    if audio[:4] == b'RIFF':
+        with wave.open(io.BytesIO(audio), 'rb') as w:
+            return PCMBuffer(w.readframes(w.getnframes()), w.getframerate(),
+                             w.getnchannels(), w.getsampwidth())
+    try:
+        import miniaudio
+        decoded = miniaudio.decode(audio, output_format=miniaudio.SampleFormat.SIGNED16,
+                                   nchannels=1, sample_rate=sample_rate)
+        return PCMBuffer(decoded.samples.tobytes(), decoded.sample_rate, decoded.nchannels)
+    except ImportError:
+        pass
+    # Fallback decoder; runs once per phrase since the result is cached
+    result = subprocess.run(
+        ['ffmpeg', '-loglevel', 'error', '-i', 'pipe:0',
+         '-f', 's16le', '-ac', '1', '-ar', str(sample_rate), 'pipe:1'],
+        input=audio, capture_output=True, check=True)
+    return PCMBuffer(result.stdout, sample_rate)
+
+class NullSink:
+    """Discards audio; for headless machines"""
+    def __init__(self):
+        self.written_bytes = 0
+        self.utterances = 0
+
+    def write(self, pcm: PCMBuffer):
+        self.written_bytes += len(pcm.data)
+        self.utterances += 1
+
+    def close(self):
+        pass
+
+class WavFileSink:
+    """Appends every utterance to a single WAV file"""
+    def __init__(self, path: str):
+        self.path = path
+        self._wav = None
+        self._format = None
+
+    def write(self, pcm: PCMBuffer):
+        if self._wav is None:
+            self._wav = wave.open(self.path, 'wb')
+            self._wav.setframerate(pcm.sample_rate)
+            self._wav.setnchannels(pcm.channels)
+            self._wav.setsampwidth(pcm.sample_width)
+            self._format = pcm.format
+        elif pcm.format != self._format:
+            raise ValueError(f"WAV sink expects {self._format}, got {pcm.format}")
+        self._wav.writeframes(pcm.data)
+
+    def close(self):
+        if self._wav is not None:
+            self._wav.close()
+            self._wav = None
+
+class SoundDeviceSink:
+    """Persistent output stream on the default audio device"""
+    def __init__(self):
+        import sounddevice
+        self._sd = sounddevice
+        self._stream = None
+        self._format = None
+
+    def write(self, pcm: PCMBuffer):
+        if self._stream is None or pcm.format != self._format:
+            self.close()
+            self._stream = self._sd.RawOutputStream(
+                samplerate=pcm.sample_rate, channels=pcm.channels, dtype=f'int{8 * pcm.sample_width}')
+            self._stream.start()
+            self._format = pcm.format
+        self._stream.write(pcm.data)
+
+    def close(self):
+        if self._stream is not None:
+            self._stream.stop()
+            self._stream.close()
+            self._stream = None
+
+def default_sink():
+    """Speaker output when available, otherwise a null sink"""
+    try:
+        return SoundDeviceSink()
+    except (ImportError, OSError) as e:
+        print(f"Audio output unavailable, using null sink: {e}")
+        return NullSink()
+
+class PlaybackEngine:
+    def __init__(self, cache: Optional[TTSCache] = None, sink=None,
+                 max_pcm_bytes: int = 64 * 1024 * 1024):
+        """Decodes each phrase once and streams the PCM to a persistent sink"""
+        self.cache = cache or get_default_cache()
+        self.sink = sink or default_sink()
+        self.max_pcm_bytes = max_pcm_bytes
+        self._pcm: "OrderedDict[str, PCMBuffer]" = OrderedDict()
+        self._pcm_bytes = 0
+        self._lock = threading.Lock()
+        self._sink_lock = threading.Lock()
+
+    def load(self, text: str, lang: str = 'en', **params) -> PCMBuffer:
+        """Return decoded PCM for a phrase, decoding it on first use"""
+        key = self.cache.key(text, lang, **params)
+        with self._lock:
+            pcm = self._pcm.get(key)
+            if pcm is not None:
+                self._pcm.move_to_end(key)
+                return pcm
+        pcm = decode_audio(self.cache.get(text, lang, **params))
+        with self._lock:
+            if key not in self._pcm and len(pcm.data) <= self.max_pcm_bytes:
+                self._pcm[key] = pcm
+                self._pcm_bytes += len(pcm.data)
+                while self._pcm_bytes > self.max_pcm_bytes:
+                    _, evicted = self._pcm.popitem(last=False)
+                    self._pcm_bytes -= len(evicted.data)
+        return pcm
+
+    def play(self, text: str, lang: str = 'en', **params):
+        with metrics.timer('tts_load'):
+            pcm = self.load(text, lang, **params)
+        with self._sink_lock, metrics.timer('audio_playback'):
+            self.sink.write(pcm)
+
+    def prewarm(self, phrases: Iterable[Tuple[str, str]], **params) -> int:
+        """Synthesize and decode every (text, lang) phrase ahead of time"""
+        loaded = 0
+        for text, lang in phrases:
+            try:
+                self.load(text, lang, **params)
+                loaded += 1
+            except Exception as e:
+                print(f"Audio prewarm error ({lang}): {e}")
+        return loaded
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'pcm_entries': len(self._pcm), 'pcm_bytes': self._pcm_bytes}
+
+    def close(self):
+        with self._sink_lock:
+            self.sink.close()
+
+_default_engine = None
+_default_lock = threading.Lock()
+
+def get_default_engine() -> PlaybackEngine:
+    """Process-wide engine so decoded phrases are shared across sessions"""
+    global _default_engine
+    with _default_lock:
+        if _default_engine is None:
+            _default_engine = PlaybackEngine()
+        return _default_engine
\ No newline at end of file
@@ -0,0 +1,249 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+import cv2
+
+VIDEO_SUFFIXES = {'.mp4', '.avi', '.mov', '.mkv', '.webm', '.m4v'}
+IMAGE_SUFFIXES = {'.jpg', '.jpeg', '.png', '.bmp'}
+
+@dataclass(frozen=True)
+class Shard:
+    source: str          # video file, or directory of frame images
+    start: int           # first frame index (inclusive)
+    end: int             # last frame index (exclusive)
+    fps: float
+    base_time: float     # epoch seconds of frame 0
+
+    @property
+    def key(self) -> str:
+        return f"{self.source}|{self.start}|{self.end}"
+
+def _frame_images(directory: Path) -> List[Path]:
+    return sorted(p for p in directory.iterdir() if p.suffix.lower() in IMAGE_SUFFIXES)
+
+def discover_sources(paths: List[str]) -> List[Path]:
+    """Video files, plus directories that hold frame dumps, found under `paths`"""
+    sources = []
+    for raw in paths:
+        path = Path(raw)
+        if path.is_file() and path.suffix.lower() in VIDEO_SUFFIXES:
+            sources.append(path)
+        elif path.is_dir():
+            videos = sorted(p for p in path.rglob('*') if p.is_file() and p.suffix.lower() in VIDEO_SUFFIXES)
+            dumps = sorted(d for d in [path, *path.rglob('*')] if d.is_dir() and _frame_images(d))
+            sources.extend(videos + dumps)
+    return sources
+
+def plan_shards(source: Path, chunk_frames: int, default_fps: float) -> List[Shard]:
+    """Split one source into frame ranges of at most `chunk_frames`"""
+    if source.is_dir():
+        total, fps = len(_frame_images(source)), default_fps
+    else:
+        cap = cv2.VideoCapture(str(source))
+        total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) if cap.isOpened() else 0
+        fps = cap.get(cv2.CAP_PROP_FPS) or default_fps
+        cap.release()
+    if total <= 0:
+        print(f"Warning: no readable frames in {source}; skipped")
+        return []
+    # Recordings are stamped as ending at the file's modification time
+    base_time = source.stat().st_mtime - total / fps
+    return [Shard(str(source), start, min(start + chunk_frames, total), fps, base_time)
+            for start in range(0, total, chunk_frames)]
+
+def _read_frames(shard: Shard, stride: int) -> Iterator[Tuple[int, Any]]:
+    if os.path.isdir(shard.source):
+        images = _frame_images(Path(shard.source))
+        for index in range(shard.start, shard.end, stride):
+            frame = cv2.imread(str(images[index]))
+            if frame is not None:
+                yield index, frame
+        return
+    cap = cv2.VideoCapture(shard.source)
+    try:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, shard.start)
+        for index in range(shard.start, shard.end):
+            # grab() skips decoding of frames we are not going to analyze
+            if (index - shard.start) % stride:
+                if not cap.grab():
+                    break
+                continue
+            ret, frame = cap.read()
+            if not ret:
+                break
+            yield index, frame
+    finally:
+        cap.release()
+
+# One detector per worker process, built by the pool initializer
+_detector = None
+
+def _init_worker(backend: str, options: Dict[str, Any]):
+    global _detector
+    cv2.setNumThreads(1)  # the pool provides the parallelism
+    if backend == 'fer':
+        from emotion_detector import EmotionDetector
+        _detector = EmotionDetector(video_source=None, **options)
+    else:
+        from enhanced_detector import EnhancedEmotionDetector
+        _detector = EnhancedEmotionDetector(video_source=None, **options)
+
+def analyze_shard(shard: Shard, stride: int = 1) -> Dict[str, Any]:
+    """Run the detector over one frame range; executes in a worker process"""
+    cpu_start = time.process_time()
+    _detector.reset()
+    events, frames = [], 0
+    for index, frame in _read_frames(shard, stride):
+        frames += 1
+        emotions = _detector.analyze_frame(frame)
+        if emotions:
+            events.append((shard.base_time + index / shard.fps, emotions))
+    return {'events': events, 'frames': frames, 'cpu': time.process_time() - cpu_start}
+
+def _load_progress(path: Path) -> Tuple[Set[str], Set[str]]:
+    """(done, started) shard signatures; started ones may have been partly logged"""
+    done, started = set(), set()
+    if path.exists():
+        with open(path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    (started if record.get('state') == 'started' else done).add(record['shard'])
+                except (ValueError, KeyError, AttributeError):
+                    continue  # torn last line from an interrupted run
+    return done, started - done
+
+def _already_logged(logger, user: str, shard: Shard) -> Set[str]:
+    """Timestamps of a shard's rows that an interrupted run got into the log"""
+    start = datetime.fromtimestamp(shard.base_time + shard.start / shard.fps)
+    end = datetime.fromtimestamp(shard.base_time + shard.end / shard.fps)
+    return {row['timestamp'] for row in logger.get_user_data(user, start=start, end=end)}
+
+def _shard_signature(shard: Shard) -> str:
+    stat = os.stat(shard.source)
+    return f"{shard.key}|{stat.st_size}|{int(stat.st_mtime)}"
+
+def run(paths: List[str], username: Optional[str] = None, language: str = 'en',
+        backend: str = 'enhanced', workers: Optional[int] = None, chunk_frames: int = 300,
+        stride: int = 1, default_fps: float = 15.0, log_file: Optional[str] = None,
+        log_backend: str = 'csv', progress_file: Optional[str] = None,
+        detector_options: Optional[Dict[str, Any]] = None, smooth: bool = False) -> Dict[str, float]:
+    """Analyze recorded sessions across a process pool and bulk-log the results
+
+    Shards are handed out in parallel but consumed in order, so nudge
+    cooldowns see events in recording order. A shard is marked started in
+    the progress file before its rows are logged and done once they are
+    flushed. A rerun skips done shards, and for a shard that was started
+    but not finished it skips the rows (by user and frame timestamp) that
+    already reached the log, so resuming never duplicates rows.
+    With `smooth`, nudges come from NudgeEngine.get_nudge_on_change and a
+    row is logged only when the user's smoothed emotion changes.
+    """
+    from emotion_smoother import SmootherConfig
+    from logger import DataLogger, DEFAULT_FILES
+    from nudge_engine import NudgeConfig, NudgeEngine
+
+    workers = workers or os.cpu_count() or 1
+    log_file = log_file or DEFAULT_FILES[log_backend]
+    progress = Path(progress_file or f"{log_file}.batch-progress.jsonl")
+    done, interrupted = _load_progress(progress)
+
+    shards = [s for source in discover_sources(paths) for s in plan_shards(source, chunk_frames, default_fps)]
+    todo = [s for s in shards if _shard_signature(s) not in done]
+    print(f"{len(shards)} shards from {len(paths)} input(s); {len(shards) - len(todo)} already done")
+
+    logger = DataLogger(log_file, buffered=True, backend=log_backend)
+    engine = NudgeEngine(NudgeConfig(smoothing=SmootherConfig()) if smooth else None)
+    totals = {'frames': 0, 'events': 0, 'cpu': 0.0}
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(backend, detector_options or {})) as pool, \
+            open(progress, 'a') as progress_out:
+        results = pool.map(analyze_shard, todo, [stride] * len(todo))
+        for shard, result in zip(todo, results):
+            user = username or Path(shard.source).stem
+            records = []
+            for ts, emotions in result['events']:
+                if smooth:
+                    nudged = engine.get_nudge_on_change(emotions, language, user, now=ts)
+                    if nudged is None:
+                        continue
+                    change, response = nudged
+                    emotion, confidence = change.emotion, change.confidence
+                else:
+                    emotion, confidence = max(emotions.items(), key=lambda x: x[1])
+                    response = engine.get_nudge(emotions, language, user, now=ts)
+                records.append({
+                    'timestamp': ts,
+                    'username': user,
+                    'emotion': emotion,
+                    'response': response,
+                    'confidence': confidence,
+                })
+            signature = _shard_signature(shard)
+            if signature in interrupted:
+                logged = _already_logged(logger, user, shard)
+                records = [r for r in records if datetime.fromtimestamp(r['timestamp']).isoformat() not in logged]
+            progress_out.write(json.dumps({'shard': signature, 'state': 'started'}) + '\n')
+            progress_out.flush()
+            logger.log_many(records)
+            logger.flush()
+            progress_out.write(json.dumps({'shard': signature, 'frames': result['frames']}) + '\n')
+            progress_out.flush()
+            totals['frames'] += result['frames']
+            totals['events'] += len(records)
+            totals['cpu'] += result['cpu']
+            elapsed = time.perf_counter() - started
+            print(f"{shard.source} [{shard.start}:{shard.end}] {result['frames']} frames, "
+                  f"{len(records)} rows ({totals['frames'] / elapsed:.1f} fps overall)")
+    logger.close()
+
+    elapsed = time.perf_counter() - started
+    summary = {
+        'shards': len(todo),
+        'frames': totals['frames'],
+        'rows': totals['events'],
+        'seconds': elapsed,
+        'workers': workers,
+        'fps': totals['frames'] / elapsed if elapsed else 0.0,
+        'fps_per_core': totals['frames'] / totals['cpu'] if totals['cpu'] else 0.0,
+    }
+    print(f"Processed {summary['frames']} frames in {elapsed:.1f} s on {workers} workers: "
+          f"{summary['fps']:.1f} fps, {summary['fps_per_core']:.1f} fps per core")
+    return summary
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Offline emotion analysis of recorded sessions")
+    parser.add_argument('paths', nargs='+', help="video files, or directories of videos / frame dumps")
+    parser.add_argument('--user', help="username for logged rows (default: the video's file name)")
+    parser.add_argument('--language', default='en', help="nudge language code")
+    parser.add_argument('--backend', choices=['enhanced', 'fer'], default='enhanced')
+    parser.add_argument('--workers', type=int, help="process pool size (default: CPU count)")
+    parser.add_argument('--chunk-frames', type=int, default=300, help="frames per shard")
+    parser.add_argument('--stride', type=int, default=1, help="analyze every Nth frame")
+    parser.add_argument('--fps', type=float, default=15.0, help="frame rate assumed for frame dumps")
+    parser.add_argument('--log-file', help="DataLogger file (default: the backend's default)")
+    parser.add_argument('--log-backend', choices=['csv', 'sqlite'], default='csv')
+    parser.add_argument('--progress-file', help="resume state (default: <log-file>.batch-progress.jsonl)")
+    parser.add_argument('--tracking', action='store_true', help="track faces between detections (enhanced)")
+    parser.add_argument('--scene-gate', action='store_true', help="skip inference on unchanged frames")
+    parser.add_argument('--smooth', action='store_true', help="log only changes of the smoothed emotion")
+    args = parser.parse_args(argv)
+
+    options: Dict[str, Any] = {'scene_gate': args.scene_gate}
+    if args.backend == 'enhanced':
+        options['tracking'] = args.tracking
+    run(args.paths, username=args.user, language=args.language, backend=args.backend,
+        workers=args.workers, chunk_frames=args.chunk_frames, stride=max(1, args.stride),
+        default_fps=args.fps, log_file=args.log_file, log_backend=args.log_backend,
+        progress_file=args.progress_file, detector_options=options, smooth=args.smooth)
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,61 @@
+import cv2
+import numpy as np
+from typing import List, Optional
+
+def synthetic_frames(count: int = 60, width: int = 640, height: int = 480, seed: int = 0) -> List[np.ndarray]:
+    """Deterministic BGR frames: textured background with a slowly moving bright blob"""
+    rng = np.random.default_rng(seed)
+    base = cv2.GaussianBlur(rng.integers(0, 256, (height, width, 3), dtype=np.uint8), (0, 0), 3)
+    frames = []
+    for i in range(count):
+        frame = base.copy()
+        cx = int(width * (0.3 + 0.4 * (i % 30) / 30))
+        cv2.ellipse(frame, (cx, height // 2), (width // 10, height // 7), 0, 0, 360, (180, 190, 220), -1)
+        frames.append(frame)
+    return frames
+
+def recorded_frames(path: str, count: int = 60) -> List[np.ndarray]:
+    """First `count` frames of a recorded video"""
+    cap = cv2.VideoCapture(path)
+    frames = []
+    while len(frames) < count:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    if not frames:
+        raise RuntimeError(f"No frames in {path}")
+    return frames
+
+class FakeCapture:
+    """Stands in for cv2.VideoCapture, looping over in-memory frames"""
+
+    def __init__(self, frames: List[np.ndarray]):
+        self.frames = frames
+        self.index = 0
+        self.opened = True
+
+    def isOpened(self) -> bool:
+        return self.opened
+
+    def set(self, prop, value) -> bool:
+        return True
+
+    def get(self, prop) -> float:
+        return 0.0
+
+    def grab(self) -> bool:
+        self.index += 1
+        return True
+
+    def read(self, image: Optional[np.ndarray] = None):
+        frame = self.frames[self.index % len(self.frames)]
+        self.index += 1
+        if image is not None and image.shape == frame.shape:
+            np.copyto(image, frame)
+            return True, image
+        return True, frame.copy()
+
+    def release(self):
+        self.opened = False
\ No newline at end of file
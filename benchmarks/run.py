@@ -0,0 +1,366 @@
+"""Benchmark the hot paths without a camera or network
+
+    python benchmarks/run.py                       # full sizes, JSON to stdout
+    python benchmarks/run.py --quick -o out.json   # 100x smaller data sets
+    python benchmarks/run.py --save-baseline benchmarks/baseline.json
+    python benchmarks/run.py --baseline benchmarks/baseline.json
+
+Compared against a baseline, any benchmark whose median time per op grew by
+more than --tolerance is reported and the exit status is 1. Baselines are
+only meaningful on the machine they were recorded on. A benchmark that also
+checks its results against a reference path reports 'mismatches'; any
+mismatch is reported the same way.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+from unittest import mock
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import cv2
+import numpy as np
+
+from fakes import FakeCapture, recorded_frames, synthetic_frames
+
+BENCHMARKS: Dict[str, Callable] = {}
+
+def benchmark(name: str):
+    def register(fn):
+        BENCHMARKS[name] = fn
+        return fn
+    return register
+
+def measure(fn: Callable[[], int], repeat: int = 5) -> Dict[str, float]:
+    """Run `fn` (which returns the number of ops it did) `repeat` times"""
+    per_op = []
+    ops = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        ops = fn()
+        per_op.append((time.perf_counter() - start) / max(ops, 1))
+    median = statistics.median(per_op)
+    return {
+        'ops': ops,
+        'repeat': repeat,
+        'seconds_per_op': median,
+        'min_seconds_per_op': min(per_op),
+        'ops_per_sec': 1.0 / median if median else 0.0,
+    }
+
+@contextmanager
+def _in_tempdir():
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix='neuronudge-bench-') as tmp:
+        os.chdir(tmp)
+        try:
+            yield Path(tmp)
+        finally:
+            os.chdir(cwd)
+
+# ---------------------------------------------------------------- detectors
+
+@benchmark('enhanced_detector.get_emotion_frame')
+def bench_enhanced(ctx) -> Dict[str, float]:
+    import enhanced_detector
+    frames = ctx['frames']
+    with mock.patch.object(enhanced_detector.cv2, 'VideoCapture', lambda *a, **k: FakeCapture(frames)):
+        detector = enhanced_detector.EnhancedEmotionDetector()
+    n = len(frames)
+
+    def run():
+        for _ in range(n):
+            detector.get_emotion_frame()
+        return n
+    return measure(run, ctx['repeat'])
+
+@benchmark('enhanced_detector.get_emotion_frame[tracking+gate]')
+def bench_enhanced_fast(ctx) -> Dict[str, float]:
+    import enhanced_detector
+    frames = ctx['frames']
+    with mock.patch.object(enhanced_detector.cv2, 'VideoCapture', lambda *a, **k: FakeCapture(frames)):
+        detector = enhanced_detector.EnhancedEmotionDetector(tracking=True, scene_gate=True)
+    n = len(frames)
+
+    def run():
+        for _ in range(n):
+            detector.get_emotion_frame()
+        return n
+    return measure(run, ctx['repeat'])
+
+@benchmark('emotion_classifier.predict[4 faces]')
+def bench_classifier(ctx) -> Dict[str, float]:
+    from emotion_classifier import FaceEmotionClassifier
+    classifier = FaceEmotionClassifier()
+    gray = cv2.cvtColor(ctx['frames'][0], cv2.COLOR_BGR2GRAY)
+    h, w = gray.shape
+    faces = [(w // 8 * i, h // 4, w // 6, h // 3) for i in range(4)]
+
+    def run():
+        for _ in range(1000):
+            classifier.predict(gray, faces)
+        return 1000
+    return measure(run, ctx['repeat'])
+
+@benchmark('emotion_detector.get_emotion_frame')
+def bench_fer(ctx) -> Dict[str, float]:
+    import emotion_detector
+    frames = ctx['frames'][:10]
+    try:
+        with mock.patch.object(emotion_detector.cv2, 'VideoCapture', lambda *a, **k: FakeCapture(frames)):
+            detector = emotion_detector.EmotionDetector()
+    except ImportError as e:
+        return {'skipped': f"{e}"}
+    n = len(frames)
+
+    def run():
+        for _ in range(n):
+            detector.get_emotion_frame()
+        return n
+    return measure(run, ctx['repeat'])
+
+# ---------------------------------------------------------------- nudges
+
+def _events(n: int, users: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    labels = ['happy', 'sad', 'angry', 'surprised', 'neutral']
+    probs = rng.dirichlet(np.full(len(labels), 0.3), size=n)
+    user_ids = [f"user{u}" for u in rng.integers(0, users, n)]
+    return labels, probs, user_ids
+
+@benchmark('nudge_engine.get_response')
+def bench_get_response(ctx) -> Dict[str, float]:
+    from nudge_engine import NudgeEngine
+    n = ctx['events']
+    labels, probs, user_ids = _events(n, 1000)
+    emotions = [dict(zip(labels, row)) for row in probs.tolist()]
+
+    def run():
+        engine = NudgeEngine(rng=random.Random(0))
+        now = 1_000_000.0
+        for i in range(n):
+            engine.get_response(emotions[i], user_ids[i], now=now + i * 0.01)
+        return n
+    return measure(run, ctx['repeat'])
+
+@benchmark('nudge_engine.get_nudge')
+def bench_get_nudge(ctx) -> Dict[str, float]:
+    from nudge_engine import NudgeEngine
+    n = ctx['events']
+    labels, probs, user_ids = _events(n, 1000)
+    emotions = [dict(zip(labels, row)) for row in probs.tolist()]
+    languages = ['en', 'hi', 'kn']
+
+    def run():
+        engine = NudgeEngine(rng=random.Random(0))
+        now = 1_000_000.0
+        for i in range(n):
+            engine.get_nudge(emotions[i], languages[i % 3], user_ids[i], now=now + i * 0.01)
+        return n
+    return measure(run, ctx['repeat'])
+
+def _batch_mismatches(labels, probs, user_ids, max_users: int) -> int:
+    """Rows where get_nudges_batch differs from get_nudge called row by row"""
+    from nudge_engine import NudgeConfig, NudgeEngine
+    scalar = NudgeEngine(NudgeConfig(max_tracked_users=max_users), rng=random.Random(0))
+    batch = NudgeEngine(NudgeConfig(max_tracked_users=max_users), rng=random.Random(0))
+    mismatches = 0
+    for start in range(0, len(probs), 100):
+        now = 1_000_000.0 + start
+        rows = range(start, min(start + 100, len(probs)))
+        expected = [scalar.get_nudge(dict(zip(labels, probs[i].tolist())), 'en', user_ids[i], now=now)
+                    for i in rows]
+        got = batch.get_nudges_batch(probs[rows.start:rows.stop], labels,
+                                     user_ids[rows.start:rows.stop], now=now)
+        mismatches += sum(a != b for a, b in zip(expected, got))
+    return mismatches
+
+@benchmark('nudge_engine.get_nudges_batch')
+def bench_get_nudges_batch(ctx) -> Dict[str, float]:
+    from nudge_engine import NudgeEngine
+    n = ctx['events']
+    labels, probs, user_ids = _events(n, 1000)
+
+    def run():
+        engine = NudgeEngine(rng=random.Random(0))
+        for start in range(0, n, 1000):
+            engine.get_nudges_batch(probs[start:start + 1000], labels, user_ids[start:start + 1000],
+                                    now=1_000_000.0 + start)
+        return n
+    result = measure(run, ctx['repeat'])
+    # Parity with the scalar path, with and without more users than the cooldown cap
+    result['mismatches'] = (_batch_mismatches(labels, probs[:2000], user_ids[:2000], 10000)
+                            + _batch_mismatches(labels, probs[:2000], user_ids[:2000], 20))
+    return result
+
+@benchmark('emotion_smoother.update')
+def bench_smoother(ctx) -> Dict[str, float]:
+    from emotion_smoother import EmotionSmoother
+    n = ctx['events']
+    labels, probs, _ = _events(n, 1)
+    emotions = [dict(zip(labels, row)) for row in probs.tolist()]
+
+    def run():
+        smoother = EmotionSmoother(labels)
+        for i in range(n):
+            smoother.update(emotions[i], now=i * 0.1)
+        return n
+    return measure(run, ctx['repeat'])
+
+# ---------------------------------------------------------------- logging
+
+@benchmark('data_logger.log')
+def bench_log(ctx) -> Dict[str, float]:
+    from logger import DataLogger
+    rows = ctx['log_rows']
+    result = {}
+    with _in_tempdir() as tmp:
+        logger = DataLogger(str(tmp / 'emotion_data.csv'), buffered=True)
+        start = time.perf_counter()
+        for i in range(rows):
+            logger.log({'username': f"user{i % 100}", 'emotion': 'happy',
+                        'response': 'Keep smiling!', 'confidence': 0.9})
+        logger.flush()
+        elapsed = time.perf_counter() - start
+        result['log'] = {'ops': rows, 'repeat': 1, 'seconds_per_op': elapsed / rows,
+                         'min_seconds_per_op': elapsed / rows, 'ops_per_sec': rows / elapsed}
+
+        def query():
+            logger.get_user_data('user42')
+            return 1
+        result['get_user_data'] = measure(query, ctx['repeat'])
+        logger.close()
+    ctx['extra']['data_logger.get_user_data'] = result['get_user_data']
+    return result['log']
+
+# ---------------------------------------------------------------- users
+
+@benchmark('app.authenticate')
+def bench_users(ctx) -> Dict[str, float]:
+    n = ctx['users']
+    with _in_tempdir():
+        try:
+            import app
+        except ImportError as e:
+            return {'skipped': f"{e}"}
+        import hashlib
+        app.USER_DATA_PATH = "data/bench_users.json"
+        hashed = hashlib.sha256(b"secret").hexdigest()
+        app.save_users({f"user{i}": {"password": hashed} for i in range(n)})
+
+        def load():
+            app.load_users()
+            return 1
+        ctx['extra']['app.load_users'] = measure(load, ctx['repeat'])
+
+        names = [f"user{i}" for i in np.random.default_rng(0).integers(0, n, 10000)]
+
+        def auth():
+            for name in names:
+                app.authenticate(name, "secret")
+            return len(names)
+        return measure(auth, ctx['repeat'])
+
+# ---------------------------------------------------------------- driver
+
+def environment() -> Dict[str, str]:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ''
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpus': str(os.cpu_count()),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+        'commit': commit,
+    }
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float) -> List[str]:
+    """Names (with ratio) of benchmarks slower than baseline by more than `tolerance`"""
+    regressions = []
+    for name, current in results.items():
+        before = baseline.get(name)
+        if not before or 'seconds_per_op' not in current or 'seconds_per_op' not in before:
+            continue
+        ratio = current['seconds_per_op'] / before['seconds_per_op']
+        current['vs_baseline'] = ratio
+        if ratio > 1.0 + tolerance:
+            regressions.append(f"{name}: {ratio:.2f}x slower")
+    return regressions
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--quick', action='store_true', help="100x smaller data sets")
+    parser.add_argument('--only', nargs='*', help="substrings of benchmark names to run")
+    parser.add_argument('--video', help="use frames from this recording instead of synthetic ones")
+    parser.add_argument('--resolution', default='640x480', help="synthetic frame size, WxH")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('-o', '--output', help="write JSON results here (default: stdout)")
+    parser.add_argument('--baseline', help="compare against this results file")
+    parser.add_argument('--save-baseline', help="also write the results here as the new baseline")
+    parser.add_argument('--tolerance', type=float, default=0.15, help="allowed slowdown, 0.15 = 15%%")
+    args = parser.parse_args(argv)
+
+    scale = 100 if args.quick else 1
+    width, height = (int(v) for v in args.resolution.lower().split('x'))
+    frames = recorded_frames(args.video) if args.video else synthetic_frames(60, width, height)
+    ctx = {
+        'frames': frames,
+        'repeat': args.repeat,
+        'events': 100_000 // scale,
+        'log_rows': 1_000_000 // scale,
+        'users': 100_000 // scale,
+        'extra': {},
+    }
+
+    results: Dict[str, Dict] = {}
+    for name, fn in BENCHMARKS.items():
+        if args.only and not any(part in name for part in args.only):
+            continue
+        print(f"running {name} ...", file=sys.stderr)
+        results[name] = fn(ctx)
+        results.update(ctx['extra'])
+        ctx['extra'] = {}
+
+    report = {'environment': environment(), 'sizes': {k: ctx[k] for k in ('events', 'log_rows', 'users')},
+              'frames': {'count': len(frames), 'shape': list(frames[0].shape),
+                         'source': args.video or 'synthetic'},
+              'results': results}
+    regressions: List[str] = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f)['results'], args.tolerance)
+        report['regressions'] = regressions
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text)
+    else:
+        print(text)
+    if args.save_baseline:
+        Path(args.save_baseline).write_text(text)
+    for line in regressions:
+        print(f"REGRESSION {line}", file=sys.stderr)
+    failures = [name for name, r in results.items() if r.get('mismatches')]
+    for name in failures:
+        print(f"MISMATCH {name}: {results[name]['mismatches']} rows differ", file=sys.stderr)
+    return 1 if regressions or failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,109 @@
+import sys
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional
+
+class _UserCooldowns:
+    __slots__ = ('times', 'newest')
+
+    def __init__(self, width: int):
+        self.times = array('d', bytes(8 * width))  # last response time per emotion slot
+        self.newest = 0.0
+
+class CooldownStore:
+    def __init__(self, ttl: float, max_users: int = 10000, hard_max_users: Optional[int] = None):
+        """Last-response times per (user, emotion), bounded by TTL and an LRU cap
+
+        A user's record expires once `ttl` (the response cooldown) has passed
+        since their last response, at which point it is indistinguishable from
+        having no record. Users are kept in write order, so both TTL expiry and
+        LRU eviction pop from the front in amortized O(1).
+
+        Evicting a user still inside their cooldown would let them be nudged
+        again at once, so over `max_users` only expired records are dropped and
+        the store may grow past the cap. Live records are evicted (oldest
+        first, counted as 'live') only beyond `hard_max_users` (default twice
+        `max_users`), which keeps memory bounded under a flood of distinct users.
+        """
+        self.ttl = ttl
+        self.max_users = max_users
+        self.hard_max_users = max(hard_max_users or 2 * max_users, max_users)
+        self._slots: Dict[str, int] = {}
+        self._users: "OrderedDict[Hashable, _UserCooldowns]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = {'ttl': 0, 'live': 0}
+
+    def _slot(self, emotion: str) -> int:
+        slot = self._slots.get(emotion)
+        if slot is None:
+            slot = self._slots[emotion] = len(self._slots)
+        return slot
+
+    def last(self, user_id: Hashable, emotion: str) -> float:
+        """Time of the last response for this pair, 0 if none is tracked"""
+        with self._lock:
+            record = self._users.get(user_id)
+            slot = self._slots.get(emotion)
+            if record is None or slot is None or slot >= len(record.times):
+                return 0.0
+            return record.times[slot]
+
+    def touch(self, user_id: Hashable, emotion: str, now: float):
+        """Record a response and evict whatever the TTL or size cap no longer allows"""
+        with self._lock:
+            slot = self._slot(emotion)
+            record = self._users.get(user_id)
+            if record is None:
+                record = self._users[user_id] = _UserCooldowns(len(self._slots))
+            else:
+                self._users.move_to_end(user_id)
+            if slot >= len(record.times):
+                record.times.extend([0.0] * (len(self._slots) - len(record.times)))
+            record.times[slot] = now
+            record.newest = max(record.newest, now)
+            self._expire(now)
+            while len(self._users) > self.hard_max_users:
+                # Last resort: memory stays bounded at the cost of this user's cooldown
+                self._users.popitem(last=False)
+                self.evictions['live'] += 1
+
+    def expire(self, now: float):
+        """Drop users whose every cooldown has run out"""
+        with self._lock:
+            self._expire(now)
+
+    def _expire(self, now: float):
+        while self._users:
+            record = next(iter(self._users.values()))
+            if now - record.newest < self.ttl:
+                break
+            self._users.popitem(last=False)
+            self.evictions['ttl'] += 1
+
+    def __len__(self) -> int:
+        return len(self._users)
+
+    def snapshot(self) -> Dict[Hashable, Dict[str, float]]:
+        """Nested {user: {emotion: time}} copy of the tracked state"""
+        with self._lock:
+            names = sorted(self._slots, key=self._slots.get)
+            return {user: {e: record.times[i] for i, e in enumerate(names)
+                           if i < len(record.times) and record.times[i]}
+                    for user, record in self._users.items()}
+
+    def memory_bytes(self) -> int:
+        """Approximate memory held by the tracked state"""
+        with self._lock:
+            total = sys.getsizeof(self._users) + sys.getsizeof(self._slots)
+            for user, record in self._users.items():
+                total += sys.getsizeof(user) + sys.getsizeof(record) + sys.getsizeof(record.times)
+            return total
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'tracked_users': len(self._users),
+            'ttl_evictions': self.evictions['ttl'],
+            'live_evictions': self.evictions['live'],
+            'memory_bytes': self.memory_bytes(),
+        }
\ No newline at end of file
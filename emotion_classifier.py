@@ -0,0 +1,116 @@
+import cv2
+import numpy as np
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+EMOTION_LABELS = ['happy', 'sad', 'angry', 'surprised', 'neutral']
+
+# Face-relative regions as (row0, row1, col0, col1) fractions of the crop
+_REGIONS = {
+    'brow': (0.10, 0.25, 0.15, 0.85),
+    'eyes': (0.25, 0.45, 0.10, 0.90),
+    'mouth': (0.62, 0.90, 0.25, 0.75),
+}
+FEATURES = ['mouth_dx', 'mouth_dy', 'mouth_open', 'mouth_std', 'eyes_dy', 'brow_contrast']
+
+# Hand-set linear model over FEATURES; replace via `weights=` with a trained .npz
+_DEFAULT_W = np.array([
+    #  happy   sad  angry  surprised  neutral
+    [0.9,  -0.4,  0.1,  0.2,  -0.3],   # mouth_dx: wide horizontal mouth edges
+    [0.3,  -0.2, -0.1,  0.6,  -0.3],   # mouth_dy
+    [0.2,  -0.1, -0.2,  1.2,  -0.5],   # mouth_open: dark mouth interior
+    [0.5,  -0.3,  0.0,  0.4,  -0.4],   # mouth_std
+    [-0.1,  0.2,  0.8,  0.5,  -0.3],   # eyes_dy: furrowed / widened eyes
+    [0.0,   0.6,  0.9, -0.4,  -0.2],   # brow_contrast: lowered brows
+], dtype=np.float32)
+_DEFAULT_B = np.log(np.array([0.55, 0.11, 0.07, 0.07, 0.20], dtype=np.float32))
+
+class FaceEmotionClassifier:
+    def __init__(self, labels: Sequence[str] = EMOTION_LABELS, input_size: int = 48,
+                 max_faces: int = 8, weights: Optional[str] = None):
+        """Score every face ROI for every emotion in one vectorized pass
+
+        Faces are cropped and resized into a preallocated uint8 batch, turned
+        into a handful of region/gradient features per face and scored by a
+        linear softmax layer, so cost grows with faces, not emotions.
+        """
+        self.labels = list(labels)
+        self.input_size = input_size
+        if weights is not None:
+            data = np.load(weights)
+            self.W, self.b = data['W'].astype(np.float32), data['b'].astype(np.float32)
+            if 'labels' in data:
+                self.labels = [str(label) for label in data['labels']]
+        else:
+            self.W, self.b = _DEFAULT_W, _DEFAULT_B
+        if self.W.shape != (len(FEATURES), len(self.labels)):
+            raise ValueError(f"Expected weights of shape {(len(FEATURES), len(self.labels))}, got {self.W.shape}")
+        s = input_size
+        self._rows = {name: slice(int(r0 * s), int(r1 * s)) for name, (r0, r1, _, _) in _REGIONS.items()}
+        self._cols = {name: slice(int(c0 * s), int(c1 * s)) for name, (_, _, c0, c1) in _REGIONS.items()}
+        self._allocate(max_faces)
+
+    def _allocate(self, max_faces: int):
+        s = self.input_size
+        self.max_faces = max_faces
+        self._batch = np.empty((max_faces, s, s), dtype=np.uint8)
+        self._norm = np.empty((max_faces, s, s), dtype=np.float32)
+        self._features = np.empty((max_faces, len(FEATURES)), dtype=np.float32)
+
+    def predict(self, gray: np.ndarray, faces) -> np.ndarray:
+        """Return an (n_faces, n_labels) array of emotion probabilities"""
+        return self.predict_batch([(gray, faces)])
+
+    def predict_batch(self, items: Sequence[Tuple[np.ndarray, Any]]) -> np.ndarray:
+        """Score the faces of several (gray, faces) frames in one pass
+
+        Rows follow input order: all faces of the first frame, then the next.
+        """
+        boxes = [np.asarray(faces, dtype=np.int32).reshape(-1, 4) for _, faces in items]
+        n = sum(len(b) for b in boxes)
+        if n == 0:
+            return np.empty((0, len(self.labels)), dtype=np.float32)
+        if n > self.max_faces:
+            self._allocate(max(n, 2 * self.max_faces))
+
+        s = self.input_size
+        i = 0
+        for (gray, _), faces in zip(items, boxes):
+            height, width = gray.shape[:2]
+            for x, y, w, h in faces:
+                x0, y0 = max(0, x), max(0, y)
+                x1, y1 = min(width, x + w), min(height, y + h)
+                if x1 <= x0 or y1 <= y0:
+                    self._batch[i].fill(0)
+                else:
+                    cv2.resize(gray[y0:y1, x0:x1], (s, s), dst=self._batch[i], interpolation=cv2.INTER_AREA)
+                i += 1
+
+        # Per-face contrast normalization
+        batch, norm = self._batch[:n], self._norm[:n]
+        np.copyto(norm, batch, casting='unsafe')
+        mean = norm.mean(axis=(1, 2), keepdims=True)
+        std = norm.std(axis=(1, 2), keepdims=True) + 1e-6
+        norm -= mean
+        norm /= std
+
+        feats = self._features[:n]
+        r, c = self._rows, self._cols
+        mouth = norm[:, r['mouth'], c['mouth']]
+        eyes = norm[:, r['eyes'], c['eyes']]
+        brow = norm[:, r['brow'], c['brow']]
+        feats[:, 0] = np.abs(np.diff(mouth, axis=2)).mean(axis=(1, 2))
+        feats[:, 1] = np.abs(np.diff(mouth, axis=1)).mean(axis=(1, 2))
+        feats[:, 2] = -mouth.mean(axis=(1, 2))
+        feats[:, 3] = mouth.std(axis=(1, 2)) - 1.0  # relative to the whole face
+        feats[:, 4] = np.abs(np.diff(eyes, axis=1)).mean(axis=(1, 2))
+        feats[:, 5] = eyes.mean(axis=(1, 2)) - brow.mean(axis=(1, 2))
+
+        logits = feats @ self.W + self.b
+        logits -= logits.max(axis=1, keepdims=True)
+        probs = np.exp(logits)
+        probs /= probs.sum(axis=1, keepdims=True)
+        return probs
+
+    def predict_dicts(self, gray: np.ndarray, faces) -> List[Dict[str, float]]:
+        """Per-face {emotion: probability} dicts"""
+        return [dict(zip(self.labels, row.tolist())) for row in self.predict(gray, faces)]
\ No newline at end of file
@@ -1,45 +1,325 @@
 import cv2
 import numpy as np
-from fer import FER
 import threading
+import time
+import uuid
+from typing import Dict, Optional, Tuple
+from scene_gate import SceneChangeGate
+from rate_governor import RateGovernor
+from inference_service import InferenceService, primary_emotions
+from frame_context import FramePool
+from metrics import metrics
+
+class FrameRingBuffer:
+    def __init__(self, shape: Tuple[int, ...], size: int = 3, dtype=np.uint8):
+        """Preallocate `size` frame slots of the given shape"""
+        if size < 2:
+            raise ValueError("Ring buffer needs at least 2 slots")
+        self.frames = np.empty((size,) + tuple(shape), dtype=dtype)
+        self.timestamps = np.zeros(size, dtype=np.float64)
+        self.size = size
+        self.seq = 0  # sequence number of the newest published frame
+        self._latest = -1
+        self._cond = threading.Condition()
+
+    def write_slot(self) -> np.ndarray:
+        """Slot the writer may fill; never the one readers are copying from"""
+        return self.frames[(self._latest + 1) % self.size]
+
+    def publish(self, timestamp: float):
+        """Mark the current write slot as the newest frame"""
+        with self._cond:
+            self._latest = (self._latest + 1) % self.size
+            self.timestamps[self._latest] = timestamp
+            self.seq += 1
+            self._cond.notify_all()
+
+    def latest(self, out: Optional[np.ndarray] = None) -> Tuple[Optional[np.ndarray], float, int]:
+        """Copy out the newest frame without waiting"""
+        with self._cond:
+            if self._latest < 0:
+                return None, 0.0, 0
+            src = self.frames[self._latest]
+            if out is None:
+                out = src.copy()
+            else:
+                np.copyto(out, src)
+            return out, float(self.timestamps[self._latest]), self.seq
+
+    def wait_newer(self, seq: int, out: np.ndarray, timeout: float = 0.5) -> Tuple[bool, float, int]:
+        """Block until a frame newer than `seq` exists, then copy it into `out`"""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self.seq > seq, timeout=timeout):
+                return False, 0.0, seq
+            np.copyto(out, self.frames[self._latest])
+            return True, float(self.timestamps[self._latest]), self.seq
+
+_fer_model = None
+_fer_lock = threading.Lock()
+
+def get_fer_model():
+    """Process-wide FER+MTCNN model; importing and loading the weights takes seconds"""
+    global _fer_model
+    with _fer_lock:
+        if _fer_model is None:
+            from fer import FER
+            _fer_model = FER(mtcnn=True)
+        return _fer_model
 
 class EmotionDetector:
-    def __init__(self, video_source=0):
-        self.detector = FER(mtcnn=True)
-        self.cap = cv2.VideoCapture(video_source, cv2.CAP_DSHOW)  # DirectShow for faster init
-        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-        self.cap.set(cv2.CAP_PROP_FPS, 15)
+    def __init__(self, video_source=0, pipelined: bool = False, buffer_size: int = 3,
+                 scene_gate: bool = False, gate_threshold: float = 4.0, force_every: int = 15,
+                 governor: Optional[RateGovernor] = None, service: Optional[InferenceService] = None):
+        # With a shared service the FER model lives there, loaded once per worker
+        self.service = service
+        self.session_id = uuid.uuid4().hex
+        self.detector = get_fer_model() if service is None else None
+        # video_source=None: no capture device, frames come in through analyze_frame
+        self.cap = None
+        if video_source is not None:
+            self.cap = cv2.VideoCapture(video_source, cv2.CAP_DSHOW)  # DirectShow for faster init
+            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
+            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+            self.cap.set(cv2.CAP_PROP_FPS, 15)
+        elif pipelined:
+            raise ValueError("Pipelined mode needs a video source")
         self.lock = threading.Lock()
-        
+        self.frames = FramePool()  # frames handed to callers; valid until the one after next
+
+        # Scene gate: reuse the last result while the picture is not changing
+        self.gate = SceneChangeGate(gate_threshold, force_every) if scene_gate else None
+        # Optional pacing of the inference loop; backs off while nobody is in view
+        self.governor = governor
+
+        # Pipelined mode: capture and inference run on their own threads
+        self.pipelined = pipelined
+        self._buffer_size = buffer_size
+        self._ring = None
+        self._ring_ready = threading.Event()
+        self._stop = threading.Event()
+        self._result_lock = threading.Lock()
+        self._emotions = None
+        self._emotions_frame_ts = 0.0
+        self._emotions_done_ts = 0.0
+        self._captured = 0
+        self._inferred = 0
+        self._gated = 0
+        self._started_at = time.time()
+        self._threads = []
+        if pipelined:
+            self._start_pipeline()
+
+    def _start_pipeline(self):
+        self._threads = [
+            threading.Thread(target=self._capture_loop, name="emotion-capture", daemon=True),
+            threading.Thread(target=self._inference_loop, name="emotion-inference", daemon=True),
+        ]
+        for t in self._threads:
+            t.start()
+
+    def _capture_loop(self):
+        """Read frames as fast as the camera delivers them into the ring buffer"""
+        while not self._stop.is_set():
+            with self.lock:
+                if not self.cap.isOpened():
+                    break
+                if self._ring is None:
+                    ret, frame = self.cap.read()
+                    if ret:
+                        self._ring = FrameRingBuffer(frame.shape, self._buffer_size, frame.dtype)
+                        np.copyto(self._ring.write_slot(), frame)
+                else:
+                    slot = self._ring.write_slot()
+                    with metrics.timer('camera_read'):
+                        ret, frame = self.cap.read(image=slot)
+                    if ret and frame is not slot:
+                        if frame.shape != slot.shape:
+                            self._ring = FrameRingBuffer(frame.shape, self._buffer_size, frame.dtype)
+                            slot = self._ring.write_slot()
+                        np.copyto(slot, frame)
+            if not ret:
+                time.sleep(0.01)
+                continue
+            self._ring.publish(time.time())
+            self._ring_ready.set()
+            self._captured += 1
+
+    def _inference_loop(self):
+        """Always run on the newest frame; older unprocessed frames are dropped"""
+        while not self._ring_ready.wait(timeout=0.1):
+            if self._stop.is_set():
+                return
+        ring = None
+        seq = 0
+        work = None
+        rgb = None
+        while not self._stop.is_set():
+            if ring is not self._ring:
+                # Camera resolution changed; start over on the new buffer
+                ring = self._ring
+                seq = 0
+                work = np.empty(ring.frames.shape[1:], dtype=ring.frames.dtype)
+                rgb = np.empty_like(work)
+            prev_seq = seq
+            ok, frame_ts, seq = ring.wait_newer(seq, work)
+            if not ok:
+                continue
+            if prev_seq and seq - prev_seq > 1:
+                metrics.inc('frames_dropped', seq - prev_seq - 1)
+            if self.gate is not None and not self.gate.check(work):
+                with self._result_lock:
+                    self._gated += 1
+                if self.governor is not None:
+                    self.governor.pace(self.gate.result is not None)
+                continue
+            emotions = None
+            if self.service is not None:
+                # `work` is reused next iteration, so the service gets its own copy
+                faces = self.service.infer(self.session_id, work.copy(), timeout=1.0)
+                if faces is None:
+                    # Timed out: nothing is cached, the next frame retries
+                    if self.governor is not None:
+                        self.governor.pace(False)
+                    continue
+                emotions = primary_emotions(faces)
+            else:
+                try:
+                    cv2.cvtColor(work, cv2.COLOR_BGR2RGB, dst=rgb)
+                    with metrics.timer('fer_detect'):
+                        results = self.detector.detect_emotions(rgb)
+                    if results:
+                        emotions = results[0]['emotions']
+                except Exception:
+                    pass
+            with self._result_lock:
+                self._emotions = emotions
+                self._emotions_frame_ts = frame_ts
+                self._emotions_done_ts = time.time()
+                self._inferred += 1
+            if self.gate is not None:
+                self.gate.update(emotions, frame_ts)
+            if self.governor is not None:
+                self.governor.pace(emotions is not None)
+
+    def get_latest(self) -> Tuple[Optional[np.ndarray], Optional[Dict[str, float]], Dict[str, float]]:
+        """Newest (frame, emotions, timestamps) from the pipeline, never blocks"""
+        if self._ring is None:
+            return None, None, {}
+        ring = self._ring
+        out = self.frames.buffer('latest', ring.frames.shape[1:], ring.frames.dtype,
+                                 slot=self.frames.next_slot())
+        frame, frame_ts, _ = ring.latest(out=out)
+        with self._result_lock:
+            emotions = self._emotions
+            timestamps = {
+                'frame': frame_ts,
+                'emotions_frame': self._emotions_frame_ts,
+                'emotions_done': self._emotions_done_ts,
+            }
+        return frame, emotions, timestamps
+
+    def stats(self) -> Dict[str, float]:
+        """Capture and inference rates since start"""
+        elapsed = max(time.time() - self._started_at, 1e-6)
+        stats = {
+            'capture_fps': self._captured / elapsed,
+            'inference_fps': self._inferred / elapsed,
+            'dropped_frames': max(self._captured - self._inferred - self._gated, 0),
+        }
+        if self.gate is not None:
+            gate = self.gate.stats()
+            stats['skip_ratio'] = gate['skip_ratio']
+            stats['emotions_staleness'] = gate['staleness']
+        if self.governor is not None:
+            governor = self.governor.stats()
+            stats['governor_state'] = governor['state']
+            stats['effective_fps'] = governor['effective_fps']
+        return stats
+
     def get_emotion_frame(self):
         """Ultra-fast frame capture with minimal delay"""
+        if self.pipelined:
+            frame, emotions, _ = self.get_latest()
+            return frame, emotions
+
+        if self.cap is None:
+            return None, None
+
         with self.lock:
-            self.cap.grab()  # Clear buffer
-            ret, frame = self.cap.read()
-            if not ret:
+            with metrics.timer('camera_read'):
+                self.cap.grab()  # Clear buffer
+                ctx = self.frames.read(self.cap)
+            if ctx is None:
                 return None, None
-            
+            frame = ctx.bgr
+            if self.gate is not None and not self.gate.check(frame):
+                return frame, self.gate.result
+
+            if self.service is not None:
+                # Pool buffers get reused, so the service gets its own copy
+                faces = self.service.infer(self.session_id, frame.copy(), timeout=0.3)
+                emotions = primary_emotions(faces)
+                if self.gate is not None and faces is not None:
+                    self.gate.update(emotions)
+                return frame, emotions
+
             # Process in background thread
             emotions = None
             def detect():
                 nonlocal emotions
                 try:
-                    rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                    results = self.detector.detect_emotions(rgb)
+                    with metrics.timer('fer_detect'):
+                        results = self.detector.detect_emotions(ctx.rgb)
                     if results:
                         emotions = results[0]['emotions']
                 except:
                     pass
-            
+
             t = threading.Thread(target=detect)
             t.start()
             t.join(timeout=0.3)  # Max 300ms for detection
-            
+            if t.is_alive():
+                metrics.inc('detect_timeouts')
+            if self.gate is not None and not t.is_alive():
+                # Timed-out runs are not cached, so the next frame retries
+                self.gate.update(emotions)
+
             return frame, emotions
 
+    def analyze_frame(self, frame: np.ndarray) -> Optional[Dict[str, float]]:
+        """Emotions for one BGR frame, run to completion on the calling thread"""
+        if self.gate is not None and not self.gate.check(frame):
+            return self.gate.result
+        emotions = None
+        if self.service is not None:
+            emotions = primary_emotions(self.service.infer(self.session_id, frame, timeout=None))
+        else:
+            try:
+                rgb = self.frames.context(frame).rgb
+                with metrics.timer('fer_detect'):
+                    results = self.detector.detect_emotions(rgb)
+                if results:
+                    emotions = results[0]['emotions']
+            except Exception:
+                pass
+        if self.gate is not None:
+            self.gate.update(emotions)
+        return emotions
+
+    def reset(self):
+        """Forget cached results, e.g. when jumping in a video"""
+        if self.gate is not None:
+            self.gate.reset()
+
     def release(self):
         """Instant camera release"""
+        self._stop.set()
+        for t in self._threads:
+            if t is not threading.current_thread():
+                t.join(timeout=1.0)
+        self._threads = []
+        if self.service is not None:
+            self.service.close_session(self.session_id)
         with self.lock:
-            if self.cap.isOpened():
+            if self.cap is not None and self.cap.isOpened():
                 self.cap.release()
\ No newline at end of file
@@ -0,0 +1,149 @@
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, NamedTuple, Optional
+
+import numpy as np
+
+@dataclass
+class SmootherConfig:
+    window: int = 8           # frames kept in the ring buffer
+    alpha: float = 0.3        # EMA weight of the newest frame
+    enter: float = 0.55       # smoothed confidence needed to enter a state
+    exit: float = 0.35        # smoothed confidence below which the state is dropped
+    margin: float = 0.1       # lead over the current state needed to switch
+    min_hold: float = 1.0     # seconds a state is held before it may switch
+    max_gap: float = 2.0      # seconds without a frame before history is discarded
+
+class EmotionChange(NamedTuple):
+    emotion: str
+    confidence: float
+    previous: Optional[str]
+
+class EmotionSmoother:
+    def __init__(self, labels: Iterable[str] = (), config: Optional[SmootherConfig] = None):
+        """Debounce per-frame emotion probabilities into a stable state
+
+        Each frame's probabilities go into a fixed-size ring buffer (running
+        windowed mean) and an EMA, both updated in O(labels) per frame. A new
+        state is entered only when its EMA reaches `enter`, leads the current
+        state by `margin`, also leads the window mean, and the current state
+        has been held for `min_hold` seconds. update() returns an
+        EmotionChange only on those transitions, so downstream nudges, speech
+        and logging run once per change rather than once per frame.
+        Labels not given up front are added the first time they are seen.
+        """
+        self.config = config or SmootherConfig()
+        if self.config.window < 1:
+            raise ValueError("Smoother window must be at least 1 frame")
+        self.labels = []
+        self._index: Dict[str, int] = {}
+        self._ring = np.zeros((self.config.window, 0))
+        self._sum = np.zeros(0)
+        self._ema = np.zeros(0)
+        self._frame = np.zeros(0)
+        for label in labels:
+            self._add_label(label)
+        self.reset()
+        self.counts = {'frames': 0, 'changes': 0}
+
+    def _add_label(self, label: str):
+        self._index[label] = len(self.labels)
+        self.labels.append(label)
+        pad = ((0, 0), (0, 1))
+        self._ring = np.pad(self._ring, pad)
+        self._sum = np.append(self._sum, 0.0)
+        self._ema = np.append(self._ema, 0.0)
+        self._frame = np.append(self._frame, 0.0)
+
+    def reset(self):
+        self._ring[:] = 0.0
+        self._sum[:] = 0.0
+        self._ema[:] = 0.0
+        self._pos = 0
+        self._filled = 0
+        self._seeded = False
+        self._last_seen: Optional[float] = None
+        self.state: Optional[str] = None
+        self.state_since = 0.0
+
+    def update(self, emotions: Optional[Dict[str, float]], now: Optional[float] = None) -> Optional[EmotionChange]:
+        """Add one frame's probabilities; an EmotionChange when the state changes"""
+        now = time.monotonic() if now is None else now
+        if self._last_seen is not None and now - self._last_seen > self.config.max_gap:
+            self.reset()
+        if not emotions:
+            return None
+        self._last_seen = now
+        self.counts['frames'] += 1
+
+        for label in emotions:
+            if label not in self._index:
+                self._add_label(label)
+        frame = self._frame
+        frame[:] = 0.0
+        for label, p in emotions.items():
+            frame[self._index[label]] = p
+
+        # Ring buffer with a running sum; re-summed on each wrap to stop drift
+        cfg = self.config
+        self._sum += frame - self._ring[self._pos]
+        self._ring[self._pos] = frame
+        self._pos = (self._pos + 1) % cfg.window
+        if self._pos == 0:
+            self._sum = self._ring.sum(axis=0)
+        self._filled = min(self._filled + 1, cfg.window)
+        if not self._seeded:
+            self._ema[:] = frame  # first frame since a reset seeds the EMA
+            self._seeded = True
+        else:
+            self._ema += cfg.alpha * (frame - self._ema)
+
+        return self._transition(now)
+
+    def _transition(self, now: float) -> Optional[EmotionChange]:
+        cfg = self.config
+        ema = self._ema
+        best = int(ema.argmax())
+        candidate, score = self.labels[best], float(ema[best])
+        if self.state is None:
+            if score >= cfg.enter and best == int(self._sum.argmax()):
+                return self._enter(candidate, score, now)
+            return None
+        current = float(ema[self._index[self.state]])
+        if candidate != self.state and now - self.state_since >= cfg.min_hold:
+            if (score >= cfg.enter and score - current >= cfg.margin
+                    and best == int(self._sum.argmax())):
+                return self._enter(candidate, score, now)
+        if current < cfg.exit and now - self.state_since >= cfg.min_hold:
+            # Nothing confident any more; the next confident emotion is a change
+            self.state = None
+            self.state_since = now
+        return None
+
+    def _enter(self, emotion: str, confidence: float, now: float) -> EmotionChange:
+        previous, self.state, self.state_since = self.state, emotion, now
+        self.counts['changes'] += 1
+        return EmotionChange(emotion, confidence, previous)
+
+    @property
+    def confidence(self) -> float:
+        """Smoothed confidence of the current state (0 when there is none)"""
+        if self.state is None:
+            return 0.0
+        return float(self._ema[self._index[self.state]])
+
+    def smoothed(self) -> Dict[str, float]:
+        """EMA probabilities by label"""
+        return dict(zip(self.labels, self._ema.tolist()))
+
+    def window_mean(self) -> Dict[str, float]:
+        """Mean probabilities over the frames currently in the ring buffer"""
+        n = max(self._filled, 1)
+        return dict(zip(self.labels, (self._sum / n).tolist()))
+
+    def stats(self) -> Dict[str, float]:
+        frames = self.counts['frames']
+        return dict(self.counts,
+                    state=self.state,
+                    confidence=self.confidence,
+                    change_ratio=self.counts['changes'] / frames if frames else 0.0)
\ No newline at end of file
@@ -0,0 +1,129 @@
+import cv2
+import numpy as np
+import uuid
+from emotion_classifier import EMOTION_LABELS, FaceEmotionClassifier
+from face_tracking import FaceTracker
+from frame_context import FrameContext, FramePool
+from inference_service import primary_emotions
+from metrics import metrics
+from scene_gate import SceneChangeGate
+
+class EnhancedEmotionDetector:
+    def __init__(self, tracking=False, detect_every=5, detect_scale=0.5,
+                 scene_gate=False, gate_threshold=4.0, force_every=15, service=None,
+                 video_source=0):
+        # video_source=None: no capture device, frames come in through analyze_frame
+        self.cap = None
+        if video_source is not None:
+            self.cap = cv2.VideoCapture(video_source)
+            if not self.cap.isOpened():
+                raise RuntimeError("Camera error")
+            self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # slow polling must not read stale frames
+        
+        # Shared service mode: models live in the process-wide pool, not per session
+        self.service = service
+        self.session_id = uuid.uuid4().hex
+        self.face_cascade = None
+        self.tracker = None
+        self.classifier = None
+        self.emotion_labels = EMOTION_LABELS
+        if service is not None and tracking:
+            # Detection frames go to the service; boxes are tracked here in between
+            self.tracker = FaceTracker(None, detect_every=detect_every)
+        if service is None:
+            self.face_cascade = cv2.CascadeClassifier(
+                cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+            
+            # Tracking mode: full detection on a downscaled frame every N frames only
+            if tracking:
+                self.tracker = FaceTracker(self.face_cascade, detect_every=detect_every,
+                                           detect_scale=detect_scale)
+            
+            self.classifier = FaceEmotionClassifier(self.emotion_labels)
+        self.face_emotions = []  # (box, emotions) for every face in the last frame
+        self.frames = FramePool()  # capture and conversion buffers reused across frames
+        
+        # Scene gate: skip detection and scoring while the picture is not changing
+        self.gate = SceneChangeGate(gate_threshold, force_every) if scene_gate else None
+    
+    def get_emotion_frame(self):
+        if self.cap is None:
+            return None, None
+        with metrics.timer('camera_read'):
+            ctx = self.frames.read(self.cap)
+        if ctx is None:
+            return None, None
+        
+        emotions = self.analyze_frame(ctx)
+        # A view into the pool; stays valid until the frame after next is read
+        return ctx.rgb, emotions
+    
+    def analyze_frame(self, frame):
+        """Emotions of the largest face in a BGR frame (or FrameContext), None if there is no face"""
+        ctx = frame if isinstance(frame, FrameContext) else self.frames.context(frame)
+        if self.gate is not None and not self.gate.check(ctx.bgr):
+            return self.gate.result
+        
+        emotions, fresh = self._infer(ctx)
+        if self.gate is not None and fresh:
+            # A timed-out request is not cached, so the next frame retries
+            self.gate.update(emotions)
+        return emotions
+    
+    def reset(self):
+        """Forget tracked faces and cached results, e.g. when jumping in a video"""
+        if self.tracker is not None:
+            self.tracker.reset()
+        if self.gate is not None:
+            self.gate.reset()
+        self.face_emotions = []
+    
+    def _infer(self, ctx):
+        """(emotions, fresh); fresh is False when the service timed out"""
+        if self.service is not None:
+            return self._infer_service(ctx)
+        
+        gray = ctx.gray
+        with metrics.timer('face_detect'):
+            if self.tracker is not None:
+                faces = self.tracker.update(gray)
+            else:
+                faces = self.face_cascade.detectMultiScale(gray, 1.3, 5)
+        
+        if len(faces) == 0:
+            self.face_emotions = []
+            return None, True
+        
+        # All faces scored for all emotions in one batched pass
+        with metrics.timer('emotion_score'):
+            probs = self.classifier.predict(gray, faces)
+        self.face_emotions = [(tuple(int(v) for v in box), dict(zip(self.emotion_labels, p.tolist())))
+                              for box, p in zip(faces, probs)]
+        
+        # The largest face drives the returned emotions
+        primary = int(np.argmax([w * h for _, _, w, h in faces]))
+        return self.face_emotions[primary][1], True
+    
+    def _infer_service(self, ctx):
+        # Pool buffers get reused, so the service gets a copy; gray when that suffices
+        image = ctx.gray if self.service.backend == 'enhanced' else ctx.bgr
+        boxes = None
+        if self.tracker is not None and not self.tracker.due():
+            with metrics.timer('face_detect'):
+                boxes = self.tracker.track(ctx.gray)
+            if len(boxes) == 0:
+                self.face_emotions = []
+                return None, True
+        faces = self.service.infer(self.session_id, image.copy(), boxes=boxes)
+        if faces is None:
+            return None, False
+        if self.tracker is not None and boxes is None:
+            self.tracker.seed(ctx.gray, [box for box, _ in faces])
+        self.face_emotions = faces
+        return primary_emotions(faces), True
+    
+    def release(self):
+        if self.service is not None:
+            self.service.close_session(self.session_id)
+        if self.cap is not None and self.cap.isOpened():
+            self.cap.release()
\ No newline at end of file
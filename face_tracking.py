@@ -0,0 +1,117 @@
+import cv2
+import numpy as np
+from typing import Dict, List
+
+class FaceTracker:
+    def __init__(self, cascade, detect_every: int = 5, detect_scale: float = 0.5,
+                 min_confidence: float = 0.6, search_margin: float = 0.4,
+                 template_width: int = 32, scale_factor: float = 1.3, min_neighbors: int = 5,
+                 refresh_above: float = 0.85, drop_below: float = 0.3):
+        """Run the Haar cascade on a downscaled frame every N frames and
+        carry face boxes forward in between with template matching limited
+        to a small search window around each box.
+
+        A confident match (score >= `refresh_above`) replaces the template
+        with the matched patch, so moving faces do not drift away from a
+        stale template; a track scoring below `drop_below` is dropped.
+        """
+        self.cascade = cascade
+        self.detect_every = max(1, detect_every)
+        self.detect_scale = detect_scale
+        self.min_confidence = min_confidence
+        self.search_margin = search_margin
+        self.template_width = template_width
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.refresh_above = refresh_above
+        self.drop_below = drop_below
+
+        self.boxes = np.empty((0, 4), dtype=np.int32)
+        self.confidences = np.empty(0, dtype=np.float32)
+        self._templates: List[np.ndarray] = []
+        self._since_detect = 0
+        self.counts = {'detections': 0, 'tracked': 0, 'lost': 0, 'refreshed': 0}
+
+    def due(self) -> bool:
+        """Whether the next frame needs a full detection rather than tracking"""
+        return bool(len(self.boxes) == 0
+                    or self._since_detect >= self.detect_every - 1
+                    or (len(self.confidences) and self.confidences.min() < self.min_confidence))
+
+    def update(self, gray: np.ndarray) -> np.ndarray:
+        """Return face boxes (x, y, w, h) for this grayscale frame"""
+        if self.due():
+            self._detect(gray)
+        else:
+            self.track(gray)
+        return self.boxes
+
+    def reset(self):
+        self.boxes = np.empty((0, 4), dtype=np.int32)
+        self.confidences = np.empty(0, dtype=np.float32)
+        self._templates = []
+
+    def _detect(self, gray: np.ndarray):
+        s = self.detect_scale
+        small = gray if s == 1.0 else cv2.resize(gray, None, fx=s, fy=s, interpolation=cv2.INTER_AREA)
+        found = self.cascade.detectMultiScale(small, self.scale_factor, self.min_neighbors)
+        self.seed(gray, np.round(np.asarray(found, dtype=np.float32).reshape(-1, 4) / s))
+
+    def seed(self, gray: np.ndarray, boxes) -> np.ndarray:
+        """Start tracking from boxes detected elsewhere (e.g. by the inference service)"""
+        self.counts['detections'] += 1
+        self._since_detect = 0
+        boxes = np.asarray(boxes, dtype=np.int32).reshape(-1, 4)
+        if len(boxes) == 0:
+            self.reset()
+            return self.boxes
+        self.boxes = boxes
+        self.confidences = np.ones(len(self.boxes), dtype=np.float32)
+        self._templates = [self._template(gray, box) for box in self.boxes]
+        return self.boxes
+
+    def _template(self, gray: np.ndarray, box: np.ndarray) -> np.ndarray:
+        """Face patch shrunk so its width is `template_width` pixels"""
+        x, y, w, h = box
+        k = self.template_width / float(w)
+        th = max(1, int(round(h * k)))
+        return cv2.resize(gray[y:y + h, x:x + w], (self.template_width, th), interpolation=cv2.INTER_AREA)
+
+    def track(self, gray: np.ndarray) -> np.ndarray:
+        """Carry the current boxes forward into this frame without detecting"""
+        self._since_detect += 1
+        height, width = gray.shape[:2]
+        kept_boxes, kept_conf, kept_templates = [], [], []
+        for box, template in zip(self.boxes, self._templates):
+            x, y, w, h = box
+            mx, my = int(w * self.search_margin), int(h * self.search_margin)
+            x0, y0 = max(0, x - mx), max(0, y - my)
+            x1, y1 = min(width, x + w + mx), min(height, y + h + my)
+            # Search at template scale so matching cost is independent of face size
+            k = self.template_width / float(w)
+            window = cv2.resize(gray[y0:y1, x0:x1], None, fx=k, fy=k, interpolation=cv2.INTER_AREA)
+            if window.shape[0] < template.shape[0] or window.shape[1] < template.shape[1]:
+                self.counts['lost'] += 1
+                continue
+            scores = cv2.matchTemplate(window, template, cv2.TM_CCOEFF_NORMED)
+            _, score, _, (dx, dy) = cv2.minMaxLoc(scores)
+            if score < self.drop_below:
+                self.counts['lost'] += 1
+                continue
+            moved = (min(max(0, x0 + int(round(dx / k))), width - w),
+                     min(max(0, y0 + int(round(dy / k))), height - h), w, h)
+            if score >= self.refresh_above:
+                template = self._template(gray, moved)
+                self.counts['refreshed'] += 1
+            kept_boxes.append(moved)
+            kept_conf.append(score)
+            kept_templates.append(template)
+        self.counts['tracked'] += 1
+        self.boxes = np.asarray(kept_boxes, dtype=np.int32).reshape(-1, 4)
+        self.confidences = np.asarray(kept_conf, dtype=np.float32)
+        self._templates = kept_templates
+        return self.boxes
+
+    def stats(self) -> Dict[str, float]:
+        frames = self.counts['detections'] + self.counts['tracked']
+        return dict(self.counts, detect_ratio=self.counts['detections'] / frames if frames else 0.0)
\ No newline at end of file
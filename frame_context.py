@@ -0,0 +1,85 @@
+import cv2
+import numpy as np
+from typing import Dict, Optional, Tuple
+
+from metrics import metrics
+
+class FramePool:
+    def __init__(self, slots: int = 2):
+        """Preallocated frame and conversion buffers reused across frames
+
+        Each new frame context takes the next of `slots` buffer sets, so
+        arrays handed out for one frame stay valid while the next frame is
+        being filled. Buffers are reallocated only when the frame shape changes.
+        """
+        if slots < 1:
+            raise ValueError("Frame pool needs at least 1 slot")
+        self.slots = slots
+        self._buffers: Dict[Tuple[str, int], np.ndarray] = {}
+        self._slot = -1
+        self.allocations = 0
+
+    def buffer(self, name: str, shape: Tuple[int, ...], dtype=np.uint8, slot: Optional[int] = None) -> np.ndarray:
+        """Reusable array for `name` in the given (default: current) slot"""
+        key = (name, self._slot if slot is None else slot)
+        buf = self._buffers.get(key)
+        if buf is None or buf.shape != tuple(shape) or buf.dtype != dtype:
+            buf = self._buffers[key] = np.empty(shape, dtype=dtype)
+            self.allocations += 1
+        return buf
+
+    def next_slot(self) -> int:
+        self._slot = (self._slot + 1) % self.slots
+        return self._slot
+
+    def read(self, cap) -> Optional["FrameContext"]:
+        """Read the next capture frame straight into a pooled buffer"""
+        slot = self.next_slot()
+        key = ('bgr', slot)
+        target = self._buffers.get(key)
+        ret, frame = cap.read(image=target) if target is not None else cap.read()
+        if not ret or frame is None:
+            return None
+        if frame is not target:
+            # First frame, or the capture changed resolution; adopt its array
+            self._buffers[key] = frame
+            self.allocations += 1
+        return FrameContext(frame, self, slot)
+
+    def context(self, frame: np.ndarray) -> "FrameContext":
+        """Wrap a frame that already exists (e.g. decoded from a file)"""
+        return FrameContext(frame, self, self.next_slot())
+
+class FrameContext:
+    __slots__ = ('bgr', '_pool', '_slot', '_rgb', '_gray')
+
+    def __init__(self, bgr: np.ndarray, pool: FramePool, slot: int):
+        """One captured frame; derived images are computed on first use only"""
+        self.bgr = bgr
+        self._pool = pool
+        self._slot = slot
+        self._rgb = None
+        self._gray = None
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        return self.bgr.shape
+
+    @property
+    def rgb(self) -> np.ndarray:
+        if self._rgb is None:
+            dst = self._pool.buffer('rgb', self.bgr.shape, slot=self._slot)
+            with metrics.timer('color_convert'):
+                self._rgb = cv2.cvtColor(self.bgr, cv2.COLOR_BGR2RGB, dst=dst)
+        return self._rgb
+
+    @property
+    def gray(self) -> np.ndarray:
+        if self._gray is None:
+            if self.bgr.ndim == 2:
+                self._gray = self.bgr
+            else:
+                dst = self._pool.buffer('gray', self.bgr.shape[:2], slot=self._slot)
+                with metrics.timer('color_convert'):
+                    self._gray = cv2.cvtColor(self.bgr, cv2.COLOR_BGR2GRAY, dst=dst)
+        return self._gray
\ No newline at end of file
@@ -0,0 +1,347 @@
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from metrics import metrics
+
+# Per-frame result: (box, {emotion: probability}) for every face found
+FaceResults = List[Tuple[Tuple[int, int, int, int], Dict[str, float]]]
+# Face boxes (x, y, w, h) a caller already knows, e.g. from a tracker
+Boxes = Optional[np.ndarray]
+
+# Models are loaded once per worker thread (or process) and reused for every batch
+_models = threading.local()
+
+def _enhanced_models():
+    if not hasattr(_models, 'enhanced'):
+        from emotion_classifier import FaceEmotionClassifier
+        cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+        _models.enhanced = (cascade, FaceEmotionClassifier())
+    return _models.enhanced
+
+def _fer_model():
+    if not hasattr(_models, 'fer'):
+        from fer import FER
+        _models.fer = FER(mtcnn=True)
+    return _models.fer
+
+def _run_enhanced(frames: List[np.ndarray], detect_scale: float, boxes: List[Boxes]) -> List[FaceResults]:
+    cascade, classifier = _enhanced_models()
+    items = []
+    for frame, known in zip(frames, boxes):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        if known is not None:
+            # Boxes from the caller's tracker: score only, no detection
+            items.append((gray, np.asarray(known, dtype=np.int32).reshape(-1, 4)))
+            continue
+        small = gray if detect_scale == 1.0 else cv2.resize(
+            gray, None, fx=detect_scale, fy=detect_scale, interpolation=cv2.INTER_AREA)
+        with metrics.timer('face_detect'):
+            found = cascade.detectMultiScale(small, 1.3, 5)
+        boxes = np.round(np.asarray(found, dtype=np.float32).reshape(-1, 4) / detect_scale).astype(np.int32)
+        items.append((gray, boxes))
+    # Faces from every frame in the batch are scored together
+    with metrics.timer('emotion_score'):
+        probs = classifier.predict_batch(items)
+    results, row = [], 0
+    for _, boxes in items:
+        faces = []
+        for box in boxes:
+            faces.append((tuple(int(v) for v in box), dict(zip(classifier.labels, probs[row].tolist()))))
+            row += 1
+        results.append(faces)
+    return results
+
+def _run_fer(frames: List[np.ndarray], boxes: List[Boxes]) -> List[FaceResults]:
+    detector = _fer_model()
+    results = []
+    for frame, known in zip(frames, boxes):
+        rectangles = None if known is None else [tuple(int(v) for v in box) for box in known]
+        try:
+            found = detector.detect_emotions(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB),
+                                             face_rectangles=rectangles)
+        except Exception:
+            found = []
+        results.append([(tuple(int(v) for v in face['box']), face['emotions']) for face in found])
+    return results
+
+def run_batch(backend: str, frames: List[np.ndarray], detect_scale: float = 0.5,
+              boxes: Optional[List[Boxes]] = None) -> List[FaceResults]:
+    """Run one cross-session batch; module-level so process pools can pickle it
+
+    Frames with boxes given are only scored; the others go through detection.
+    """
+    boxes = boxes or [None] * len(frames)
+    if backend == 'fer':
+        return _run_fer(frames, boxes)
+    return _run_enhanced(frames, detect_scale, boxes)
+
+def _warm_worker(backend: str, frame: np.ndarray, detect_scale: float, barrier) -> bool:
+    """Load this worker's models, then hold it until every worker has done the same"""
+    run_batch(backend, [frame], detect_scale)
+    try:
+        barrier.wait()
+        return True
+    except threading.BrokenBarrierError:
+        return False
+
+def primary_emotions(faces: Optional[FaceResults]) -> Optional[Dict[str, float]]:
+    """Emotions of the largest face, as the detectors report them"""
+    if not faces:
+        return None
+    return max(faces, key=lambda face: face[0][2] * face[0][3])[1]
+
+@dataclass
+class _Request:
+    session: Hashable
+    frame: np.ndarray
+    future: Future
+    boxes: Boxes = None
+    submitted: float = field(default_factory=time.monotonic)
+
+class _SessionStats:
+    __slots__ = ('submitted', 'dropped', 'completed', 'latency_total', 'latency_max')
+
+    def __init__(self):
+        self.submitted = self.dropped = self.completed = 0
+        self.latency_total = self.latency_max = 0.0
+
+class InferenceService:
+    def __init__(self, backend: str = 'enhanced', workers: int = 2, executor: str = 'thread',
+                 max_batch: int = 8, queue_size: int = 2, detect_scale: float = 0.5):
+        """Process-wide emotion inference shared by all sessions
+
+        Each session gets a bounded queue; when it is full the oldest pending
+        frame is dropped (its future is cancelled), so a slow service degrades
+        to fresher-but-fewer results instead of growing latency. A scheduler
+        thread builds batches round-robin, one frame per session per pass, and
+        keeps at most `workers` batches in flight on a thread or process pool.
+        """
+        if backend not in ('enhanced', 'fer'):
+            raise ValueError(f"Unknown inference backend: {backend}")
+        if executor not in ('thread', 'process'):
+            raise ValueError(f"Unknown executor type: {executor}")
+        self.backend = backend
+        self.workers = max(1, workers)
+        self.max_batch = max(1, max_batch)
+        self.queue_size = max(1, queue_size)
+        self.detect_scale = detect_scale
+        pool = ThreadPoolExecutor if executor == 'thread' else ProcessPoolExecutor
+        self._pool = pool(max_workers=self.workers)
+        self.executor = executor
+
+        self._queues: "OrderedDict[Hashable, deque]" = OrderedDict()
+        self._stats: Dict[Hashable, _SessionStats] = {}
+        self._cond = threading.Condition()
+        self._slots = threading.Semaphore(self.workers)
+        self._closed = False
+        self._warming = False
+        self._warmed = threading.Event()
+        self.batches = 0
+        self.batched_frames = 0
+        self._scheduler = threading.Thread(target=self._schedule_loop, name="inference-scheduler", daemon=True)
+        self._scheduler.start()
+
+    def warm_up(self, shape: Tuple[int, ...] = (480, 640, 3), timeout: float = 60.0) -> float:
+        """Load the models on every worker now instead of on the first frame
+
+        One warm-up task per worker; a barrier keeps each task on its worker
+        until all have loaded, so no worker can take two. Only the first call
+        does the work; concurrent and later calls wait until it has finished.
+        """
+        with self._cond:
+            first = not self._warming
+            self._warming = True
+        if not first:
+            self._warmed.wait(timeout)
+            return 0.0
+        started = time.perf_counter()
+        manager = None
+        try:
+            if self.executor == 'process':
+                import multiprocessing
+                manager = multiprocessing.Manager()
+                barrier = manager.Barrier(self.workers, timeout=timeout)
+            else:
+                barrier = threading.Barrier(self.workers, timeout=timeout)
+            frame = np.zeros(shape, dtype=np.uint8)
+            futures = [self._pool.submit(_warm_worker, self.backend, frame, self.detect_scale, barrier)
+                       for _ in range(self.workers)]
+            if not all(future.result() for future in futures):
+                print("Inference warm-up: not every worker was reached")
+        finally:
+            if manager is not None:
+                manager.shutdown()
+            self._warmed.set()
+        elapsed = time.perf_counter() - started
+        metrics.observe('model_warmup', elapsed)
+        return elapsed
+
+    def submit(self, session: Hashable, frame: np.ndarray, boxes: Boxes = None) -> Future:
+        """Queue a BGR frame for a session; the future resolves to FaceResults
+
+        With `boxes`, faces are not detected again, only scored.
+        """
+        future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Inference service is closed")
+            queue = self._queues.get(session)
+            if queue is None:
+                queue = self._queues[session] = deque()
+                self._stats[session] = _SessionStats()
+            stats = self._stats[session]
+            if len(queue) >= self.queue_size:
+                queue.popleft().future.cancel()
+                stats.dropped += 1
+                metrics.inc('frames_dropped')
+            queue.append(_Request(session, frame, future, boxes))
+            stats.submitted += 1
+            self._cond.notify()
+        return future
+
+    def infer(self, session: Hashable, frame: np.ndarray, timeout: float = 0.3,
+              boxes: Boxes = None) -> Optional[FaceResults]:
+        """Submit and wait; None if the result is not ready within `timeout`
+
+        A request that timed out before reaching a worker is withdrawn, so it
+        neither holds a queue place nor costs a batch slot.
+        """
+        future = self.submit(session, frame, boxes)
+        try:
+            return future.result(timeout=timeout)
+        except TimeoutError:
+            metrics.inc('detect_timeouts')
+            self._withdraw(session, future)
+            return None
+        except Exception:
+            return None
+
+    def _withdraw(self, session: Hashable, future: Future):
+        with self._cond:
+            queue = self._queues.get(session)
+            if queue:
+                for request in queue:
+                    if request.future is future:
+                        queue.remove(request)
+                        break
+        future.cancel()  # no-op once a worker has it
+
+    def close_session(self, session: Hashable):
+        """Drop a session's pending frames and forget it"""
+        with self._cond:
+            for request in self._queues.pop(session, ()):
+                request.future.cancel()
+            self._stats.pop(session, None)
+
+    def _take_batch(self) -> List[_Request]:
+        batch: List[_Request] = []
+        while len(batch) < self.max_batch:
+            took = False
+            for session in list(self._queues):
+                queue = self._queues[session]
+                if not queue:
+                    continue
+                batch.append(queue.popleft())
+                took = True
+                # Served sessions go to the back so the next batch starts elsewhere
+                self._queues.move_to_end(session)
+                if len(batch) >= self.max_batch:
+                    break
+            if not took:
+                break
+        return batch
+
+    def _schedule_loop(self):
+        while True:
+            self._slots.acquire()
+            with self._cond:
+                self._cond.wait_for(lambda: self._closed or any(self._queues.values()))
+                if self._closed:
+                    self._slots.release()
+                    return
+                batch = [r for r in self._take_batch() if r.future.set_running_or_notify_cancel()]
+            if not batch:
+                self._slots.release()
+                continue
+            self.batches += 1
+            self.batched_frames += len(batch)
+            try:
+                pending = self._pool.submit(run_batch, self.backend, [r.frame for r in batch], self.detect_scale,
+                                            [r.boxes for r in batch])
+            except RuntimeError as e:  # pool shut down underneath us
+                for request in batch:
+                    request.future.set_exception(e)
+                self._slots.release()
+                return
+            pending.add_done_callback(lambda done, batch=batch: self._complete(batch, done))
+
+    def _complete(self, batch: List[_Request], done: Future):
+        self._slots.release()
+        now = time.monotonic()
+        error = done.exception()
+        results = None if error else done.result()
+        with self._cond:
+            for request in batch:
+                stats = self._stats.get(request.session)
+                if stats is not None:
+                    latency = now - request.submitted
+                    metrics.observe('service_latency', latency)
+                    stats.completed += 1
+                    stats.latency_total += latency
+                    stats.latency_max = max(stats.latency_max, latency)
+        for i, request in enumerate(batch):
+            if error:
+                request.future.set_exception(error)
+            else:
+                request.future.set_result(results[i])
+
+    def stats(self) -> Dict[str, Any]:
+        """Service-wide and per-session counters"""
+        with self._cond:
+            sessions = {
+                str(session): {
+                    'pending': len(self._queues.get(session, ())),
+                    'submitted': s.submitted,
+                    'dropped': s.dropped,
+                    'completed': s.completed,
+                    'latency_avg': s.latency_total / s.completed if s.completed else 0.0,
+                    'latency_max': s.latency_max,
+                } for session, s in self._stats.items()
+            }
+        return {
+            'backend': self.backend,
+            'executor': self.executor,
+            'workers': self.workers,
+            'sessions': len(sessions),
+            'batches': self.batches,
+            'avg_batch': self.batched_frames / self.batches if self.batches else 0.0,
+            'per_session': sessions,
+        }
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            for queue in self._queues.values():
+                for request in queue:
+                    request.future.cancel()
+            self._queues.clear()
+            self._cond.notify_all()
+        self._pool.shutdown(wait=False)
+
+_default_service = None
+_default_lock = threading.Lock()
+
+def get_default_service(**kwargs) -> InferenceService:
+    """Process-wide service shared by all Streamlit sessions"""
+    global _default_service
+    with _default_lock:
+        if _default_service is None:
+            _default_service = InferenceService(**kwargs)
+        return _default_service
\ No newline at end of file
@@ -0,0 +1,212 @@
+import csv
+import gzip
+import json
+import os
+import shutil
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+from log_storage import FIELDNAMES
+
+# Closed segment formats, most preferred first when several copies exist mid-conversion
+SEGMENT_SUFFIXES = ('.seg', '.csv.gz', '.csv')
+DICT_COLUMNS = {'username': np.uint32, 'emotion': np.uint16, 'response': np.uint32}
+
+def _epoch_us(timestamp: str, utc: bool = True) -> int:
+    """Naive ISO times are read as UTC, so they round-trip exactly (no DST gaps or repeats)"""
+    value = datetime.fromisoformat(timestamp)
+    if utc and value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(round(value.timestamp() * 1_000_000))
+
+def _iso_from_us(us: int, utc: bool = True) -> str:
+    if not utc:
+        return datetime.fromtimestamp(us / 1_000_000).isoformat()
+    return datetime.fromtimestamp(us / 1_000_000, tz=timezone.utc).replace(tzinfo=None).isoformat()
+
+def segment_suffix(path: Path) -> str:
+    name = path.name
+    for suffix in SEGMENT_SUFFIXES:
+        if name.endswith(suffix):
+            return suffix
+    return ''
+
+def write_columnar(rows: Iterable[Dict[str, Any]], path: Path):
+    """Write rows as a directory of .npy columns plus dictionaries, atomically"""
+    path = Path(path)
+    ts, conf = [], []
+    codes: Dict[str, List[int]] = {name: [] for name in DICT_COLUMNS}
+    values: Dict[str, Dict[str, int]] = {name: {} for name in DICT_COLUMNS}
+    for row in rows:
+        try:
+            ts.append(_epoch_us(row['timestamp']))
+        except (KeyError, ValueError):
+            continue
+        conf.append(float(row.get('confidence') or 0))
+        for name in DICT_COLUMNS:
+            mapping = values[name]
+            value = row.get(name) or ''
+            code = mapping.get(value)
+            if code is None:
+                code = mapping[value] = len(mapping)
+            codes[name].append(code)
+
+    tmp = path.with_name(path.name + '.tmp')
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    np.save(tmp / 'timestamp.npy', np.asarray(ts, dtype=np.int64))
+    # float64 so values read back equal to what the CSV rows held
+    np.save(tmp / 'confidence.npy', np.asarray(conf, dtype=np.float64))
+    for name, dtype in DICT_COLUMNS.items():
+        np.save(tmp / f'{name}.npy', np.asarray(codes[name], dtype=dtype))
+    meta = {name: list(mapping) for name, mapping in values.items()}
+    meta['timestamp_clock'] = 'utc'
+    with open(tmp / 'dict.json', 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False)
+    shutil.rmtree(path, ignore_errors=True)
+    os.rename(tmp, path)
+
+class ColumnarSegment:
+    def __init__(self, path):
+        """Memory-mapped view of a columnar segment; columns are not copied"""
+        self.path = Path(path)
+        self.timestamp = np.load(self.path / 'timestamp.npy', mmap_mode='r')
+        self.confidence = np.load(self.path / 'confidence.npy', mmap_mode='r')
+        self.codes = {name: np.load(self.path / f'{name}.npy', mmap_mode='r') for name in DICT_COLUMNS}
+        with open(self.path / 'dict.json', encoding='utf-8') as f:
+            self.dictionaries: Dict[str, List[str]] = json.load(f)
+        # Segments written before timestamps were stored as UTC used local time
+        self.utc = self.dictionaries.pop('timestamp_clock', 'local') == 'utc'
+
+    def __len__(self) -> int:
+        return len(self.timestamp)
+
+    def code_of(self, column: str, value: str) -> Optional[int]:
+        try:
+            return self.dictionaries[column].index(value)
+        except ValueError:
+            return None
+
+    def mask(self, username: Optional[str] = None,
+             start: Optional[str] = None, end: Optional[str] = None) -> np.ndarray:
+        """Vectorized row filter; ISO bounds, `end` exclusive"""
+        keep = np.ones(len(self), dtype=bool)
+        if username is not None:
+            code = self.code_of('username', username)
+            if code is None:
+                return np.zeros(len(self), dtype=bool)
+            keep &= self.codes['username'] == code
+        if start is not None:
+            keep &= self.timestamp >= _epoch_us(start, self.utc)
+        if end is not None:
+            keep &= self.timestamp < _epoch_us(end, self.utc)
+        return keep
+
+    def select(self, username: Optional[str] = None,
+               start: Optional[str] = None, end: Optional[str] = None) -> np.ndarray:
+        """Positions of matching rows"""
+        return np.flatnonzero(self.mask(username, start, end))
+
+    def rows(self, index: Optional[np.ndarray] = None) -> List[Dict[str, Any]]:
+        """Materialize rows (all, or the given positions) as DataLogger dicts"""
+        if index is None:
+            index = np.arange(len(self))
+        lookups = {name: self.dictionaries[name] for name in DICT_COLUMNS}
+        columns = {name: self.codes[name][index] for name in DICT_COLUMNS}
+        ts = self.timestamp[index]
+        conf = self.confidence[index]
+        return [{
+            'timestamp': _iso_from_us(int(ts[i]), self.utc),
+            'username': lookups['username'][columns['username'][i]],
+            'emotion': lookups['emotion'][columns['emotion'][i]],
+            'response': lookups['response'][columns['response'][i]],
+            'confidence': float(conf[i]),
+        } for i in range(len(index))]
+
+def _csv_rows(f) -> Iterator[Dict[str, Any]]:
+    with f:
+        yield from csv.DictReader(f)
+
+def read_segment(path: Path) -> Iterator[Dict[str, Any]]:
+    """Iterate rows of any closed segment format
+
+    The file is opened before this returns, so a missing segment raises
+    FileNotFoundError here rather than part-way through a query.
+    """
+    suffix = segment_suffix(path)
+    if suffix == '.seg':
+        return iter(ColumnarSegment(path).rows())
+    if suffix == '.csv.gz':
+        return _csv_rows(gzip.open(path, 'rt', newline=''))
+    return _csv_rows(open(path, 'r', newline=''))
+
+def write_segment(rows: Iterable[Dict[str, Any]], path: Path):
+    """Write rows in the format implied by the path suffix, atomically"""
+    path = Path(path)
+    if segment_suffix(path) == '.seg':
+        write_columnar(rows, path)
+        return
+    tmp = path.with_name(path.name + '.tmp')
+    opener = gzip.open if path.name.endswith('.gz') else open
+    with opener(tmp, 'wt', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDNAMES)
+        writer.writeheader()
+        writer.writerows(rows)
+    os.replace(tmp, path)
+
+def convert_segment(path: Path, fmt: str) -> Path:
+    """Turn a freshly rotated plain CSV segment into 'csv.gz' or 'columnar'"""
+    target = path.with_name(path.name[:-len('.csv')] + ('.seg' if fmt == 'columnar' else '.csv.gz'))
+    if fmt == 'columnar':
+        write_columnar(read_segment(path), target)
+    else:
+        tmp = target.with_name(target.name + '.tmp')
+        with open(path, 'rb') as src, gzip.open(tmp, 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+        os.replace(tmp, target)
+    path.unlink()
+    return target
+
+def current_path(path: Path) -> Optional[Path]:
+    """Where a listed segment lives now that a background conversion may have replaced it"""
+    stem = path.name[:-len(segment_suffix(path))]
+    for suffix in SEGMENT_SUFFIXES:
+        candidate = path.with_name(stem + suffix)
+        if candidate.exists():
+            return candidate
+    return None
+
+def list_segments(directory: Path) -> List[Path]:
+    """Closed segments in rotation order, one path per segment"""
+    if not directory.exists():
+        return []
+    best: Dict[str, Path] = {}
+    for p in directory.iterdir():
+        suffix = segment_suffix(p)
+        if not suffix or p.name.endswith('.tmp'):
+            continue
+        stem = p.name[:-len(suffix)]
+        current = best.get(stem)
+        if current is None or SEGMENT_SUFFIXES.index(suffix) < SEGMENT_SUFFIXES.index(segment_suffix(current)):
+            best[stem] = p
+    return [best[stem] for stem in sorted(best)]
+
+def remove_user(path: Path, username: str) -> int:
+    """Rewrite one segment without a user's rows; returns rows removed"""
+    if segment_suffix(path) == '.seg':
+        seg = ColumnarSegment(path)
+        drop = seg.mask(username=username)
+        removed = int(drop.sum())
+        if removed:
+            kept = seg.rows(np.flatnonzero(~drop))
+            del seg
+            write_columnar(kept, path)
+        return removed
+    rows = list(read_segment(path))
+    kept = [row for row in rows if row.get('username') != username]
+    if len(kept) != len(rows):
+        write_segment(kept, path)
+    return len(rows) - len(kept)
\ No newline at end of file
@@ -0,0 +1,392 @@
+import csv
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Union
+
+FIELDNAMES = ['timestamp', 'username', 'emotion', 'response', 'confidence']
+
+TimeBound = Optional[Union[str, datetime]]
+
+def _iso(value: TimeBound) -> Optional[str]:
+    if value is None or isinstance(value, str):
+        return value
+    return value.isoformat()
+
+def _typed(rows: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    """CSV rows with confidence as a float, as columnar segments and SQLite return it"""
+    for row in rows:
+        try:
+            row['confidence'] = float(row.get('confidence') or 0)
+        except ValueError:
+            pass
+        yield row
+
+def _in_range(timestamp: str, start: Optional[str], end: Optional[str]) -> bool:
+    """ISO timestamps compare correctly as strings; `end` is exclusive"""
+    return (start is None or timestamp >= start) and (end is None or timestamp < end)
+
+class CSVStorage:
+    """Flat CSV file; every query is a full scan
+
+    With `max_bytes` and/or `max_age` (seconds) set, the active file is rotated
+    into `<name>.segments/` and each closed segment is converted in the
+    background to `segment_format`: 'csv.gz' (compressed text), 'columnar'
+    (memory-mapped NumPy columns, see log_segments) or None (left as is).
+    Reads span all segments plus the active file and return confidence as a
+    float whatever the segment format.
+    """
+    kind = "csv"
+
+    def __init__(self, filename: str = "data/emotion_data.csv", max_bytes: Optional[int] = None,
+                 max_age: Optional[float] = None, segment_format: Optional[str] = 'csv.gz'):
+        if segment_format not in (None, 'csv.gz', 'columnar'):
+            raise ValueError(f"Unknown segment format {segment_format!r}")
+        self.filename = filename
+        os.makedirs(os.path.dirname(filename) or '.', exist_ok=True)
+        self.lock = threading.RLock()
+        self._file = None
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.segment_format = segment_format
+        self.segment_dir = Path(os.path.splitext(filename)[0] + '.segments')
+        self._converters: List[threading.Thread] = []
+        # Reads run concurrently but not during a rewrite: replacing a columnar
+        # segment directory is not atomic, so a reader could miss it entirely
+        self._gate = threading.Condition()
+        self._readers = 0
+        self._rewriting = False
+        if not Path(filename).exists():
+            self._write_header()
+        self._segment_started = self._first_timestamp() or time.time()
+
+    def _write_header(self):
+        with open(self.filename, 'w', newline='') as f:
+            csv.writer(f).writerow(FIELDNAMES)
+
+    def _first_timestamp(self) -> Optional[float]:
+        """Epoch time of the oldest row in the active file"""
+        for row in self._active_rows():
+            try:
+                return datetime.fromisoformat(row['timestamp']).timestamp()
+            except (KeyError, ValueError):
+                return None
+        return None
+
+    def append(self, rows: List[List[Any]]):
+        with self.lock:
+            if self._file is None:
+                self._file = open(self.filename, 'a', newline='')
+            csv.writer(self._file).writerows(rows)
+            self._file.flush()
+            if self._rotation_due():
+                self.rotate()
+
+    def _rotation_due(self) -> bool:
+        if self.max_bytes is not None and self._file.tell() >= self.max_bytes:
+            return True
+        return self.max_age is not None and time.time() - self._segment_started >= self.max_age
+
+    def rotate(self) -> Optional[Path]:
+        """Close the active file as a segment and start a new one"""
+        from log_segments import convert_segment, list_segments
+        with self.lock:
+            self.release()
+            if self._first_timestamp() is None:
+                return None
+            self.segment_dir.mkdir(parents=True, exist_ok=True)
+            seq = len(list_segments(self.segment_dir)) + 1
+            segment = self.segment_dir / f"{seq:06d}-{datetime.now():%Y%m%dT%H%M%S}.csv"
+            os.replace(self.filename, segment)
+            self._write_header()
+            self._segment_started = time.time()
+            if self.segment_format is not None:
+                t = threading.Thread(target=convert_segment, args=(segment, self.segment_format),
+                                     name="datalogger-segment", daemon=True)
+                t.start()
+                self._converters = [c for c in self._converters if c.is_alive()] + [t]
+            return segment
+
+    def wait_for_segments(self):
+        """Block until background segment conversions have finished"""
+        for t in list(self._converters):
+            t.join()
+        self._converters = []
+
+    def sync(self):
+        with self.lock:
+            if self._file is not None:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+
+    def release(self):
+        """Close the append handle; reopened on next append"""
+        with self.lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    @contextmanager
+    def _reading(self):
+        with self._gate:
+            self._gate.wait_for(lambda: not self._rewriting)
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._gate:
+                self._readers -= 1
+                self._gate.notify_all()
+
+    @contextmanager
+    def _rewrite(self):
+        """Exclusive against readers; new readers wait while this drains the current ones"""
+        with self._gate:
+            self._gate.wait_for(lambda: not self._rewriting)
+            self._rewriting = True
+            self._gate.wait_for(lambda: self._readers == 0)
+        try:
+            yield
+        finally:
+            with self._gate:
+                self._rewriting = False
+                self._gate.notify_all()
+
+    def _segments(self) -> List[Path]:
+        if not self.segment_dir.exists():
+            return []
+        from log_segments import list_segments
+        return list_segments(self.segment_dir)
+
+    def _active_rows(self) -> Iterable[Dict[str, str]]:
+        try:
+            with open(self.filename, 'r', newline='') as f:
+                yield from csv.DictReader(f)
+        except FileNotFoundError:
+            return
+
+    def _open_segment(self, segment: Path):
+        """(ColumnarSegment, None) or (None, rows) for a listed segment
+
+        A conversion finishing between listing and opening replaces the file;
+        the converted copy is read instead. A segment that is gone is skipped.
+        """
+        from log_segments import SEGMENT_SUFFIXES, ColumnarSegment, current_path, read_segment, segment_suffix
+        for _ in range(len(SEGMENT_SUFFIXES)):
+            try:
+                if segment_suffix(segment) == '.seg':
+                    return ColumnarSegment(segment), None
+                return None, read_segment(segment)
+            except FileNotFoundError:
+                segment = current_path(segment)
+                if segment is None:
+                    break
+        return None, iter(())
+
+    def columnar_segments(self):
+        """Memory-mapped ColumnarSegment views of every columnar segment"""
+        from log_segments import ColumnarSegment, segment_suffix
+        with self._reading():
+            return [ColumnarSegment(p) for p in self._segments() if segment_suffix(p) == '.seg']
+
+    def _row_sources(self, username: Optional[str], start: Optional[str], end: Optional[str]):
+        """Yield (segment, matches) per source; columnar segments are filtered vectorized"""
+        def matching(rows):
+            return _typed(row for row in rows
+                          if (username is None or row.get('username') == username)
+                          and _in_range(row.get('timestamp', ''), start, end))
+
+        for segment in self._segments():
+            seg, rows = self._open_segment(segment)
+            if seg is not None:
+                yield seg, seg.select(username, start, end)
+            else:
+                yield None, matching(rows)
+        yield None, matching(self._active_rows())
+
+    def query(self, username: Optional[str] = None, start: TimeBound = None, end: TimeBound = None,
+              limit: Optional[int] = None, offset: int = 0) -> List[Dict[str, Any]]:
+        with self._reading():
+            return self._query(username, _iso(start), _iso(end), limit, offset)
+
+    def _query(self, username: Optional[str], start: Optional[str], end: Optional[str],
+               limit: Optional[int], offset: int) -> List[Dict[str, Any]]:
+        out = []
+        skipped = 0
+        for seg, rows in self._row_sources(username, start, end):
+            if seg is not None:
+                # Columnar: apply offset/limit to the index before materializing rows
+                drop = max(offset - skipped, 0)
+                skipped += min(drop, len(rows))
+                index = rows[drop:]
+                if limit is not None:
+                    index = index[:limit - len(out)]
+                out.extend(seg.rows(index))
+            else:
+                for row in rows:
+                    if skipped < offset:
+                        skipped += 1
+                        continue
+                    out.append(row)
+                    if limit is not None and len(out) >= limit:
+                        break
+            if limit is not None and len(out) >= limit:
+                break
+        return out
+
+    def count(self, username: Optional[str] = None) -> int:
+        total = 0
+        with self._reading():
+            for seg, rows in self._row_sources(username, None, None):
+                total += len(rows) if seg is not None else sum(1 for _ in rows)
+        return total
+
+    def delete_user(self, username: str) -> int:
+        """Rewrite the active file and any segments holding the user's rows; returns rows removed"""
+        with self.lock, self._rewrite():
+            self.release()
+            self.wait_for_segments()
+            removed = 0
+            if self._segments():
+                from log_segments import remove_user
+                for segment in self._segments():
+                    removed += remove_user(segment, username)
+            rows = list(self._active_rows())
+            kept = [row for row in rows if row.get('username') != username]
+            tmp = f"{self.filename}.tmp"
+            with open(tmp, 'w', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=FIELDNAMES)
+                writer.writeheader()
+                writer.writerows(kept)
+            os.replace(tmp, self.filename)
+            return removed + len(rows) - len(kept)
+
+    def close(self):
+        self.release()
+        self.wait_for_segments()
+
+class SQLiteStorage:
+    """SQLite table indexed on (username, timestamp)"""
+    kind = "sqlite"
+
+    def __init__(self, filename: str = "data/emotion_data.db"):
+        self.filename = filename
+        os.makedirs(os.path.dirname(filename) or '.', exist_ok=True)
+        self.lock = threading.RLock()
+        self._connection: Optional[sqlite3.Connection] = None
+        with self.lock, self._conn() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS emotion_log (
+                    id INTEGER PRIMARY KEY,
+                    timestamp TEXT NOT NULL,
+                    username TEXT NOT NULL,
+                    emotion TEXT,
+                    response TEXT,
+                    confidence REAL
+                )""")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_user_time ON emotion_log (username, timestamp)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_time ON emotion_log (timestamp)")
+
+    def _conn(self) -> sqlite3.Connection:
+        """The one shared connection; callers hold self.lock
+
+        Streamlit runs every script on a fresh thread, so per-thread
+        connections would pile up; one connection can always be closed.
+        WAL still lets other processes read alongside the writer.
+        """
+        if self._connection is None:
+            conn = sqlite3.connect(self.filename, timeout=5.0, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.row_factory = sqlite3.Row
+            self._connection = conn
+        return self._connection
+
+    def append(self, rows: List[List[Any]]):
+        with self.lock, self._conn() as conn:
+            conn.executemany(
+                "INSERT INTO emotion_log (timestamp, username, emotion, response, confidence) "
+                "VALUES (?, ?, ?, ?, ?)", rows)
+
+    def sync(self):
+        with self.lock:
+            self._conn().execute("PRAGMA wal_checkpoint(PASSIVE)")
+
+    def release(self):
+        pass
+
+    def query(self, username: Optional[str] = None, start: TimeBound = None, end: TimeBound = None,
+              limit: Optional[int] = None, offset: int = 0) -> List[Dict[str, Any]]:
+        clauses, params = [], []
+        if username is not None:
+            clauses.append("username = ?")
+            params.append(username)
+        if start is not None:
+            clauses.append("timestamp >= ?")
+            params.append(_iso(start))
+        if end is not None:
+            clauses.append("timestamp < ?")
+            params.append(_iso(end))
+        sql = f"SELECT {', '.join(FIELDNAMES)} FROM emotion_log"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY timestamp, id LIMIT ? OFFSET ?"
+        params += [-1 if limit is None else limit, offset]
+        with self.lock:
+            return [dict(row) for row in self._conn().execute(sql, params)]
+
+    def count(self, username: Optional[str] = None) -> int:
+        with self.lock:
+            if username is None:
+                return self._conn().execute("SELECT COUNT(*) FROM emotion_log").fetchone()[0]
+            return self._conn().execute(
+                "SELECT COUNT(*) FROM emotion_log WHERE username = ?", (username,)).fetchone()[0]
+
+    def delete_user(self, username: str) -> int:
+        with self.lock, self._conn() as conn:
+            return conn.execute("DELETE FROM emotion_log WHERE username = ?", (username,)).rowcount
+
+    def import_csv(self, csv_path: str, batch_size: int = 10000) -> int:
+        """Bulk-load rows from a DataLogger CSV file"""
+        imported = 0
+        batch = []
+        with open(csv_path, 'r', newline='') as f:
+            for row in csv.DictReader(f):
+                batch.append([row.get(k, '') for k in FIELDNAMES[:4]] + [float(row.get('confidence') or 0)])
+                if len(batch) >= batch_size:
+                    self.append(batch)
+                    imported += len(batch)
+                    batch = []
+        if batch:
+            self.append(batch)
+            imported += len(batch)
+        return imported
+
+    def close(self):
+        with self.lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+def migrate_csv_to_sqlite(csv_path: str = "data/emotion_data.csv",
+                          db_path: str = "data/emotion_data.db") -> int:
+    """Copy an existing CSV log into SQLite, then rename the CSV so it is not imported twice"""
+    if not Path(csv_path).exists():
+        return 0
+    storage = SQLiteStorage(db_path)
+    imported = storage.import_csv(csv_path)
+    os.replace(csv_path, f"{csv_path}.migrated")
+    storage.close()
+    return imported
+
+BACKENDS = {'csv': CSVStorage, 'sqlite': SQLiteStorage}
+
+if __name__ == "__main__":
+    import sys
+    src = sys.argv[1] if len(sys.argv) > 1 else "data/emotion_data.csv"
+    dst = sys.argv[2] if len(sys.argv) > 2 else "data/emotion_data.db"
+    print(f"Migrated {migrate_csv_to_sqlite(src, dst)} rows from {src} to {dst}")
\ No newline at end of file
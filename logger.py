@@ -1,63 +1,348 @@
-import csv
+import atexit
 import os
+import threading
+import time
 from datetime import datetime
-from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable, Optional, Union
+
+from log_storage import BACKENDS, CSVStorage, SQLiteStorage, TimeBound
+from metrics import metrics
+from rollups import EmotionRollups
+
+DEFAULT_FILES = {'csv': "data/emotion_data.csv", 'sqlite': "data/emotion_data.db"}
+
+class BufferedWriter:
+    def __init__(self, storage, flush_rows: int = 500,
+                 flush_bytes: int = 64 * 1024, flush_interval: float = 1.0):
+        """Collect rows in memory and append them to storage in batches from a background thread"""
+        self.storage = storage
+        self.flush_rows = flush_rows
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+        self.lock = threading.RLock()  # guards the pending rows only
+        self.io_lock = threading.RLock()  # orders storage writes; held around each batch
+        self._cond = threading.Condition(self.lock)
+        self._rows: List[List[Any]] = []
+        self._bytes = 0
+        self._oldest = 0.0
+        self._closed = False
+        self.flushes = 0
+        self._thread = threading.Thread(target=self._run, name="datalogger-flush", daemon=True)
+        self._thread.start()
+
+    def append(self, row: List[Any]):
+        size = sum(len(str(v)) for v in row) + len(row)
+        with self._cond:
+            if self._closed:
+                raise ValueError("Writer is closed")
+            if not self._rows:
+                self._oldest = time.monotonic()
+            self._rows.append(row)
+            self._bytes += size
+            if len(self._rows) >= self.flush_rows or self._bytes >= self.flush_bytes:
+                self._cond.notify()
+
+    def extend(self, rows: List[List[Any]]):
+        """Append many rows under one lock acquisition"""
+        if not rows:
+            return
+        size = sum(sum(len(str(v)) for v in row) + len(row) for row in rows)
+        with self._cond:
+            if self._closed:
+                raise ValueError("Writer is closed")
+            if not self._rows:
+                self._oldest = time.monotonic()
+            self._rows.extend(rows)
+            self._bytes += size
+            if len(self._rows) >= self.flush_rows or self._bytes >= self.flush_bytes:
+                self._cond.notify()
+
+    def flush(self, fsync: bool = False):
+        """Write out everything buffered so far
+
+        The pending rows are swapped out under `lock` and written under
+        `io_lock` only, so append() never waits on the storage write.
+        """
+        with self.io_lock:
+            with self.lock:
+                rows, self._rows, self._bytes = self._rows, [], 0
+            if rows:
+                try:
+                    self.storage.append(rows)
+                except Exception:
+                    with self.lock:
+                        # Put the batch back ahead of anything appended meanwhile
+                        self._rows[:0] = rows
+                        self._bytes += sum(sum(len(str(v)) for v in row) + len(row) for row in rows)
+                    raise
+                self.flushes += 1
+            if fsync:
+                self.storage.sync()
+
+    def release_file(self):
+        """Flush and let the storage drop open handles, e.g. before a rewrite"""
+        with self.io_lock:
+            self.flush(fsync=True)
+            self.storage.release()
+
+    def close(self):
+        """Flush durably and stop the background thread"""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify()
+        self._thread.join(timeout=5.0)
+        self.release_file()
+
+    def _due(self) -> bool:
+        return (len(self._rows) >= self.flush_rows or self._bytes >= self.flush_bytes
+                or (self._rows and time.monotonic() - self._oldest >= self.flush_interval))
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._closed or self._due(), timeout=self.flush_interval)
+                if self._closed:
+                    return
+                due = self._due()
+            if due:
+                try:
+                    self.flush()
+                except Exception as e:
+                    print(f"Logging error: {e}")
+
+# One storage and one writer per file so concurrent sessions share handles and buffers.
+# Each is reference counted by the DataLoggers using it; the last close() closes it.
+_storages: Dict[tuple, Any] = {}
+_writers: Dict[tuple, BufferedWriter] = {}
+_refs: Dict[tuple, int] = {}
+_rollups: Dict[tuple, EmotionRollups] = {}
+_shared_lock = threading.Lock()
+
+def _shared_storage(kind: str, filename: str, **options):
+    key = (kind, os.path.abspath(filename))
+    with _shared_lock:
+        storage = _storages.get(key)
+        if storage is None:
+            storage = _storages[key] = BACKENDS[kind](filename, **options)
+        _refs[('storage',) + key] = _refs.get(('storage',) + key, 0) + 1
+        return storage
+
+def _shared_writer(storage, **options) -> BufferedWriter:
+    key = (storage.kind, os.path.abspath(storage.filename))
+    with _shared_lock:
+        writer = _writers.get(key)
+        if writer is None or writer._closed:
+            writer = _writers[key] = BufferedWriter(storage, **options)
+            _refs[('writer',) + key] = 0
+        else:
+            differing = {k: v for k, v in options.items() if getattr(writer, k) != v}
+            if differing:
+                current = {k: getattr(writer, k) for k in differing}
+                print(f"Warning: {storage.filename} already has a buffered writer; "
+                      f"ignoring {differing}, keeping {current}")
+        _refs[('writer',) + key] += 1
+        return writer
+
+def _release_shared(storage, writer: Optional[BufferedWriter]):
+    """Drop one DataLogger's references; the last user closes the writer and storage"""
+    key = (storage.kind, os.path.abspath(storage.filename))
+    close_writer = close_storage = False
+    with _shared_lock:
+        if writer is not None and _writers.get(key) is writer:
+            _refs[('writer',) + key] -= 1
+            if _refs[('writer',) + key] <= 0:
+                del _writers[key], _refs[('writer',) + key]
+                close_writer = True
+        if _storages.get(key) is storage:
+            _refs[('storage',) + key] -= 1
+            if _refs[('storage',) + key] <= 0:
+                del _storages[key], _refs[('storage',) + key]
+                close_storage = True
+    if close_writer:
+        writer.close()
+    if close_storage:
+        storage.close()
+
+def _shared_rollups(storage) -> EmotionRollups:
+    """Rollups for a storage file, restored from their snapshot or rebuilt with one scan"""
+    key = (storage.kind, os.path.abspath(storage.filename))
+    with _shared_lock:
+        rollups = _rollups.get(key)
+        if rollups is None:
+            rollups = EmotionRollups(f"{storage.filename}.rollups.json")
+            if not rollups.load() or rollups.rows_seen != storage.count():
+                rollups = EmotionRollups(rollups.path)
+                rollups.add_rows(storage.query())
+            _rollups[key] = rollups
+        return rollups
+
+@atexit.register
+def _close_writers():
+    with _shared_lock:
+        writers = list(_writers.values())
+        rollups = list(_rollups.values())
+    for writer in writers:
+        writer.close()
+    for r in rollups:
+        r.save()
 
 class DataLogger:
-    def __init__(self, filename: str = "data/emotion_data.csv"):
-        """Initialize with automatic directory creation"""
-        self.filename = filename
-        os.makedirs(os.path.dirname(filename), exist_ok=True)
-        self._ensure_header()
-
-    def _ensure_header(self):
-        """Create file with headers if doesn't exist"""
-        if not Path(self.filename).exists():
-            with open(self.filename, 'w', newline='') as f:
-                writer = csv.writer(f)
-                writer.writerow(['timestamp', 'username', 'emotion', 'response', 'confidence'])
+    def __init__(self, filename: Optional[str] = None, buffered: bool = False,
+                 flush_rows: int = 500, flush_bytes: int = 64 * 1024, flush_interval: float = 1.0,
+                 backend: str = 'csv', rollups: bool = False,
+                 rotate_bytes: Optional[int] = None, rotate_age: Optional[float] = None,
+                 segment_format: Optional[str] = 'csv.gz'):
+        """Initialize with automatic directory creation
 
+        `backend` is 'csv' (flat file, full scans) or 'sqlite' (indexed per-user
+        and time-range queries); see log_storage.migrate_csv_to_sqlite to move
+        an existing CSV log over. With `rollups`, per-user aggregates are kept
+        up to date on every log() call (see rollups.EmotionRollups).
+        `rotate_bytes`/`rotate_age` rotate the CSV log into closed segments
+        stored as `segment_format` (see log_storage.CSVStorage).
+        """
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend {backend!r}")
+        options = {}
+        if rotate_bytes is not None or rotate_age is not None:
+            if backend != 'csv':
+                raise ValueError("Rotation is only supported by the csv backend")
+            options = dict(max_bytes=rotate_bytes, max_age=rotate_age, segment_format=segment_format)
+        self.filename = filename or DEFAULT_FILES[backend]
+        self.storage: Union[CSVStorage, SQLiteStorage] = _shared_storage(backend, self.filename, **options)
+        self._writer: Optional[BufferedWriter] = None
+        self._closed = False
+        self._writer_options = dict(flush_rows=flush_rows, flush_bytes=flush_bytes,
+                                    flush_interval=flush_interval)
+        if buffered:
+            self._writer = _shared_writer(self.storage, **self._writer_options)
+        self.rollups: Optional[EmotionRollups] = _shared_rollups(self.storage) if rollups else None
+
+    @metrics.timed('datalog')
     def log(self, data: Dict[str, Any]) -> bool:
         """Log emotion data with timestamp"""
+        now = datetime.now()
+        row = [
+            now.isoformat(),
+            data.get('username', ''),
+            data.get('emotion', ''),
+            data.get('response', ''),
+            data.get('confidence', 0)
+        ]
         try:
-            with open(self.filename, 'a', newline='') as f:
-                writer = csv.writer(f)
-                writer.writerow([
-                    datetime.now().isoformat(),
-                    data.get('username', ''),
-                    data.get('emotion', ''),
-                    data.get('response', ''),
-                    data.get('confidence', 0)
-                ])
+            if self._writer is not None:
+                if self._writer._closed:
+                    # Another logger on this file closed the shared writer
+                    self._writer = _shared_writer(self.storage, **self._writer_options)
+                self._writer.append(row)
+            else:
+                self.storage.append([row])
+            if self.rollups is not None:
+                self.rollups.add(row[1], row[2], float(row[4] or 0), now.timestamp())
             return True
         except Exception as e:
             print(f"Logging error: {e}")
             return False
 
-    def get_data(self) -> List[Dict[str, str]]:
-        """Return all logged data as list of dictionaries"""
+    def log_many(self, records: Iterable[Dict[str, Any]]) -> int:
+        """Log many records in one storage write; returns the number logged
+
+        Records may carry their own 'timestamp' (datetime, epoch seconds or
+        ISO string), e.g. for offline analysis of recorded sessions.
+        """
+        rows, times = [], []
+        now = datetime.now()
+        for data in records:
+            ts = data.get('timestamp') or now
+            if isinstance(ts, (int, float)):
+                ts = datetime.fromtimestamp(ts)
+            elif isinstance(ts, str):
+                ts = datetime.fromisoformat(ts)
+            rows.append([
+                ts.isoformat(),
+                data.get('username', ''),
+                data.get('emotion', ''),
+                data.get('response', ''),
+                data.get('confidence', 0)
+            ])
+            times.append(ts.timestamp())
+        if not rows:
+            return 0
         try:
-            with open(self.filename, 'r') as f:
-                return list(csv.DictReader(f))
-        except FileNotFoundError:
-            return []
+            if self._writer is not None:
+                if self._writer._closed:
+                    self._writer = _shared_writer(self.storage, **self._writer_options)
+                self._writer.extend(rows)
+            else:
+                self.storage.append(rows)
+            if self.rollups is not None:
+                for row, ts in zip(rows, times):
+                    self.rollups.add(row[1], row[2], float(row[4] or 0), ts)
+            return len(rows)
+        except Exception as e:
+            print(f"Logging error: {e}")
+            return 0
+
+    def flush(self):
+        """Write buffered rows to disk"""
+        if self._writer is not None:
+            self._writer.flush(fsync=True)
+        else:
+            self.storage.sync()
+        if self.rollups is not None:
+            self.rollups.save()
+
+    def close(self):
+        """Flush, and release the shared writer and storage once no other logger uses them"""
+        if self._closed:
+            return
+        self._closed = True
+        if self._writer is not None:
+            self._writer.flush(fsync=True)
+        _release_shared(self.storage, self._writer)
+        self._writer = None
+        if self.rollups is not None:
+            self.rollups.save()
+
+    def _pending(self):
+        """Make buffered rows visible to reads"""
+        if self._writer is not None:
+            self._writer.flush()
+
+    def get_data(self, start: TimeBound = None, end: TimeBound = None,
+                 limit: Optional[int] = None, offset: int = 0) -> List[Dict[str, Any]]:
+        """Return all logged data as list of dictionaries"""
+        self._pending()
+        return self.storage.query(start=start, end=end, limit=limit, offset=offset)
+
+    def get_user_data(self, username: str, start: TimeBound = None, end: TimeBound = None,
+                      limit: Optional[int] = None, offset: int = 0) -> List[Dict[str, Any]]:
+        """Get data for specific user, optionally within [start, end) and paginated"""
+        self._pending()
+        return self.storage.query(username, start, end, limit, offset)
+
+    def get_user_page(self, username: str, page: int, page_size: int = 100) -> List[Dict[str, Any]]:
+        """Get one page (0-based) of a user's history"""
+        return self.get_user_data(username, limit=page_size, offset=page * page_size)
 
-    def get_user_data(self, username: str) -> List[Dict[str, str]]:
-        """Get data for specific user"""
-        all_data = self.get_data()
-        return [row for row in all_data if row.get('username') == username]
+    def count(self, username: Optional[str] = None) -> int:
+        self._pending()
+        return self.storage.count(username)
 
     def clear_user_data(self, username: str) -> bool:
         """Clear data for specific user"""
         try:
-            all_data = self.get_data()
-            user_data = [row for row in all_data if row.get('username') != username]
-            
-            with open(self.filename, 'w', newline='') as f:
-                writer = csv.DictWriter(f, fieldnames=['timestamp', 'username', 'emotion', 'response', 'confidence'])
-                writer.writeheader()
-                writer.writerows(user_data)
+            if self._writer is None:
+                self.storage.delete_user(username)
+            else:
+                # Hold the writer's IO lock so no batch lands mid-delete
+                with self._writer.io_lock:
+                    self._writer.release_file()
+                    self.storage.delete_user(username)
+            if self.rollups is not None:
+                self.rollups.drop_user(username)
             return True
         except Exception as e:
             print(f"Error clearing user data: {e}")
@@ -0,0 +1,206 @@
+import functools
+import math
+import os
+import threading
+import time
+from array import array
+from typing import Dict, List, Optional
+
+# Log-spaced latency buckets: 1 µs .. ~100 s, about 9% apart
+_MIN_SECONDS = 1e-6
+_GROWTH = 1.09
+_BUCKETS = int(math.ceil(math.log(1e8) / math.log(_GROWTH))) + 1
+QUANTILES = (0.5, 0.95, 0.99)
+
+class LatencyHistogram:
+    __slots__ = ('counts', 'count', 'total', 'max', '_lock')
+
+    def __init__(self):
+        """Fixed-memory latency distribution; quantiles are within one bucket (~9%)"""
+        self.counts = array('Q', bytes(8 * _BUCKETS))
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        if seconds <= _MIN_SECONDS:
+            index = 0
+        else:
+            index = min(_BUCKETS - 1, int(math.log(seconds / _MIN_SECONDS) / math.log(_GROWTH)) + 1)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total += seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th observation"""
+        with self._lock:
+            if not self.count:
+                return 0.0
+            rank = q * self.count
+            seen = 0
+            for index, n in enumerate(self.counts):
+                seen += n
+                if seen >= rank and n:
+                    return min(self.max, _MIN_SECONDS * _GROWTH ** index)
+            return self.max
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_TIMER = _NullTimer()
+
+class _Timer:
+    __slots__ = ('_histogram', '_start')
+
+    def __init__(self, histogram: LatencyHistogram):
+        self._histogram = histogram
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._histogram.observe(time.perf_counter() - self._start)
+        return False
+
+class MetricsRegistry:
+    def __init__(self, enabled: bool = False, prefix: str = 'neuronudge'):
+        """Named stage latencies and counters for the whole process
+
+        While disabled, timer() hands back a shared no-op context manager and
+        inc()/observe() return immediately, so instrumented code pays one
+        attribute check per call.
+        """
+        self.enabled = enabled
+        self.prefix = prefix
+        self._histograms: Dict[str, LatencyHistogram] = {}
+        self._counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._exporter: Optional[threading.Thread] = None
+        self._server = None
+
+    def enable(self, enabled: bool = True):
+        self.enabled = enabled
+
+    def histogram(self, name: str) -> LatencyHistogram:
+        histogram = self._histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(name, LatencyHistogram())
+        return histogram
+
+    def timer(self, name: str):
+        """Context manager timing one run of a stage"""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self.histogram(name))
+
+    def timed(self, name: str):
+        """Decorator form of timer(); checks `enabled` on every call"""
+        def decorate(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                with _Timer(self.histogram(name)):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def observe(self, name: str, seconds: float):
+        if self.enabled:
+            self.histogram(name).observe(seconds)
+
+    def inc(self, name: str, amount: int = 1):
+        if self.enabled:
+            with self._lock:
+                self._counters[name] = self._counters.get(name, 0) + amount
+
+    def reset(self):
+        with self._lock:
+            self._histograms = {}
+            self._counters = {}
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """{'latency': {stage: {...}}, 'counters': {name: value}} in seconds"""
+        with self._lock:
+            histograms = dict(self._histograms)
+            counters = dict(self._counters)
+        latency = {}
+        for name, h in sorted(histograms.items()):
+            stats = {'count': h.count, 'mean': h.total / h.count if h.count else 0.0, 'max': h.max}
+            for q in QUANTILES:
+                stats[f'p{int(q * 100)}'] = h.quantile(q)
+            latency[name] = stats
+        return {'latency': latency, 'counters': counters}
+
+    def to_prometheus(self) -> str:
+        """Prometheus text exposition format (summaries and counters)"""
+        snap = self.snapshot()
+        lines: List[str] = []
+        name = f'{self.prefix}_stage_latency_seconds'
+        if snap['latency']:
+            lines.append(f'# HELP {name} Pipeline stage latency')
+            lines.append(f'# TYPE {name} summary')
+            for stage, stats in snap['latency'].items():
+                for q in QUANTILES:
+                    lines.append(f'{name}{{stage="{stage}",quantile="{q}"}} {stats[f"p{int(q * 100)}"]:.9f}')
+                lines.append(f'{name}_sum{{stage="{stage}"}} {stats["mean"] * stats["count"]:.9f}')
+                lines.append(f'{name}_count{{stage="{stage}"}} {stats["count"]}')
+        for counter, value in sorted(snap['counters'].items()):
+            metric = f'{self.prefix}_{counter}_total'
+            lines.append(f'# TYPE {metric} counter')
+            lines.append(f'{metric} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path: str):
+        """Atomically write the exposition text, e.g. for node_exporter's textfile collector"""
+        tmp = f'{path}.{os.getpid()}.tmp'
+        with open(tmp, 'w') as f:
+            f.write(self.to_prometheus())
+        os.replace(tmp, path)
+
+    def start_exporter(self, path: Optional[str] = None, port: Optional[int] = None,
+                       interval: float = 5.0):
+        """Write `path` every `interval` seconds and/or serve /metrics on `port`"""
+        if path and self._exporter is None:
+            def loop():
+                while True:
+                    time.sleep(interval)
+                    try:
+                        self.write_prometheus(path)
+                    except OSError as e:
+                        print(f"Metrics export error: {e}")
+            self._exporter = threading.Thread(target=loop, name="metrics-exporter", daemon=True)
+            self._exporter.start()
+        if port and self._server is None:
+            from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+            registry = self
+
+            class Handler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    body = registry.to_prometheus().encode()
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+                def log_message(self, *args):
+                    pass
+
+            self._server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+            threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True).start()
+
+# Process-wide registry; enable with NEURONUDGE_METRICS=1 or metrics.enable()
+metrics = MetricsRegistry(enabled=os.environ.get('NEURONUDGE_METRICS', '') not in ('', '0'))
\ No newline at end of file
@@ -1,16 +1,23 @@
-from typing import Dict, Optional, List
+from typing import Dict, Optional, List, Sequence, Tuple, Union
 import random
+from collections import OrderedDict
 from dataclasses import dataclass
 import time
+import numpy as np
+from cooldown_store import CooldownStore
+from emotion_smoother import EmotionChange, EmotionSmoother, SmootherConfig
+from metrics import metrics
 
 @dataclass
 class NudgeConfig:
     min_confidence: float = 0.4
     response_cooldown: float = 5.0  # seconds between same emotion responses
     language_map: Dict[str, Dict[str, List[str]]] = None
+    max_tracked_users: int = 10000  # cap on users with cooldown state; live ones kept up to 2x
+    smoothing: Optional[SmootherConfig] = None  # debounce per-frame emotions per user
 
 class NudgeEngine:
-    def __init__(self, config: Optional[NudgeConfig] = None):
+    def __init__(self, config: Optional[NudgeConfig] = None, rng: Optional[random.Random] = None):
         # Pre-defined responses for quick access
         self._responses = {
             'happy': [
@@ -52,10 +59,11 @@ class NudgeEngine:
         
         # Configuration with defaults
         self.config = config or NudgeConfig()
+        self._rng = rng or random  # module-level RNG unless a seeded one is given
         
-        # Response tracking
-        self.last_responses = {}
-        self.last_response_time = {}
+        # Response tracking; entries expire once the cooldown has passed
+        self.cooldowns = CooldownStore(self.config.response_cooldown, self.config.max_tracked_users)
+        self._smoothers: "OrderedDict[str, EmotionSmoother]" = OrderedDict()
         
         # Initialize language mappings if not provided
         if self.config.language_map is None:
@@ -70,44 +78,82 @@ class NudgeEngine:
                 }
             }
 
-    def get_response(self, emotions: Optional[Dict[str, float]], user_id: str = "default") -> str:
+    def get_response(self, emotions: Optional[Dict[str, float]], user_id: str = "default",
+                     now: Optional[float] = None) -> str:
         """
         Get appropriate response based on detected emotions
         with cooldown period for same emotion responses.
         
+        With `config.smoothing` set, the dominant emotion is the user's
+        smoothed state rather than this frame's maximum; a frame without
+        emotions still gets a neutral response.
+        
         Args:
             emotions: Dictionary of emotion probabilities
             user_id: Unique identifier for response tracking
+            now: Event time in epoch seconds (defaults to the current time)
             
         Returns:
             str: Appropriate response text
         """
-        # Default response if no emotions detected
-        if not emotions:
-            return self._get_random_response('neutral')
+        return self._respond(emotions, user_id, now)[1]
+
+    def _respond(self, emotions: Optional[Dict[str, float]], user_id: str, now: Optional[float],
+                 changes_only: bool = False) -> Tuple[str, Optional[str], Optional[EmotionChange]]:
+        """(dominant emotion, response, smoothed change) for one event
+
+        With `changes_only`, no response is picked (None) unless the user's
+        smoothed emotion changed on this event.
+        """
+        current_time = time.time() if now is None else now
+        change = None
         
-        # Get dominant emotion
-        dominant_emotion, confidence = max(emotions.items(), key=lambda x: x[1])
+        if self.config.smoothing is not None:
+            smoother = self._smoother(user_id)
+            change = smoother.update(emotions, current_time)
+            if changes_only and change is None:
+                return smoother.state or 'neutral', None, None
+            if not emotions or smoother.state is None:
+                # No face this frame: nothing is said about the stale smoothed state
+                return 'neutral', self._get_random_response('neutral'), change
+            dominant_emotion, confidence = smoother.state, smoother.confidence
+        elif not emotions:
+            # Default response if no emotions detected
+            return 'neutral', self._get_random_response('neutral'), change
+        else:
+            # Get dominant emotion
+            dominant_emotion, confidence = max(emotions.items(), key=lambda x: x[1])
         
         # Check confidence threshold
         if confidence < self.config.min_confidence:
-            return self._get_random_response('neutral')
+            return dominant_emotion, self._get_random_response('neutral'), change
         
         # Check response cooldown
-        current_time = time.time()
-        last_time = self.last_response_time.get(user_id, {}).get(dominant_emotion, 0)
+        last_time = self.cooldowns.last(user_id, dominant_emotion)
         
         if current_time - last_time < self.config.response_cooldown:
-            return self._get_random_response('neutral')
+            return dominant_emotion, self._get_random_response('neutral'), change
         
         # Update tracking
-        self.last_response_time.setdefault(user_id, {})[dominant_emotion] = current_time
+        self.cooldowns.touch(user_id, dominant_emotion, current_time)
         
-        return self._get_random_response(dominant_emotion)
+        return dominant_emotion, self._get_random_response(dominant_emotion), change
 
+    def _smoother(self, user_id: str) -> EmotionSmoother:
+        smoother = self._smoothers.get(user_id)
+        if smoother is None:
+            smoother = self._smoothers[user_id] = EmotionSmoother(self._responses, self.config.smoothing)
+            if len(self._smoothers) > self.config.max_tracked_users:
+                self._smoothers.popitem(last=False)
+        else:
+            self._smoothers.move_to_end(user_id)
+        return smoother
+
+    @metrics.timed('nudge')
     def get_nudge(self, emotions: Optional[Dict[str, float]], 
                  language: str = 'en', 
-                 user_id: str = "default") -> str:
+                 user_id: str = "default",
+                 now: Optional[float] = None) -> str:
         """
         Get language-appropriate nudge based on emotions
         
@@ -115,24 +161,135 @@ class NudgeEngine:
             emotions: Dictionary of emotion probabilities
             language: Target language code (e.g., 'en', 'hi', 'kn')
             user_id: Unique identifier for response tracking
+            now: Event time in epoch seconds (defaults to the current time)
             
         Returns:
             str: Appropriate nudge in requested language
         """
-        base_response = self.get_response(emotions, user_id)
+        emotion, base_response, _ = self._respond(emotions, user_id, now)
+        return self._localize(emotion, base_response, language)
+
+    def get_nudge_on_change(self, emotions: Optional[Dict[str, float]],
+                            language: str = 'en',
+                            user_id: str = "default",
+                            now: Optional[float] = None) -> Optional[Tuple[EmotionChange, str]]:
+        """
+        Smoothed get_nudge for event streams: feed every frame, get a nudge
+        only when the user's smoothed emotion changes
         
-        # Return translated response if available
+        Args:
+            emotions: Dictionary of emotion probabilities for one frame
+            language: Target language code (e.g., 'en', 'hi', 'kn')
+            user_id: Unique identifier for response tracking
+            now: Event time in epoch seconds (defaults to the current time)
+            
+        Returns:
+            (EmotionChange, nudge) on a change of smoothed state, else None
+        """
+        if self.config.smoothing is None:
+            raise ValueError("get_nudge_on_change needs NudgeConfig.smoothing")
+        emotion, base_response, change = self._respond(emotions, user_id, now, changes_only=True)
+        if change is None:
+            return None
+        return change, self._localize(emotion, base_response, language)
+
+    def _localize(self, emotion: str, base_response: str, language: str) -> str:
+        """Return translated response if available"""
         if language != 'en' and language in self.config.language_map:
             lang_responses = self.config.language_map[language]
-            emotion = max(emotions.items(), key=lambda x: x[1])[0] if emotions else 'neutral'
             if emotion in lang_responses:
-                return random.choice(lang_responses[emotion])
-        
+                return self._rng.choice(lang_responses[emotion])
         return base_response
 
+    def get_nudges_batch(self, probs: np.ndarray, emotions: Sequence[str],
+                         user_ids: Sequence[str],
+                         languages: Union[str, Sequence[str]] = 'en',
+                         now: Optional[float] = None) -> List[str]:
+        """
+        Vectorized get_nudge over a batch of events
+        
+        Rows are processed as if get_nudge were called on each in order with
+        the same `now`, so a seeded RNG yields identical results. If the batch
+        could push the cooldown store past its hard cap, cooldowns are checked
+        row by row so evictions happen exactly where get_nudge would see them.
+        Rows are independent events: `config.smoothing` does not apply here.
+        
+        Args:
+            probs: N x K matrix of emotion probabilities
+            emotions: K emotion labels, in column order
+            user_ids: N user identifiers
+            languages: One language code for all rows, or N codes
+            now: Event time in epoch seconds (defaults to the current time)
+            
+        Returns:
+            List[str]: One nudge per row
+        """
+        probs = np.asarray(probs, dtype=np.float64)
+        n, k = probs.shape
+        if n == 0:
+            return []
+        now = time.time() if now is None else now
+        languages = [languages] * n if isinstance(languages, str) else list(languages)
+        labels = list(emotions)
+
+        # Dominant emotion and confidence threshold
+        dominant = probs.argmax(axis=1)
+        passes = probs[np.arange(n), dominant] >= self.config.min_confidence
+
+        # Cooldown, evaluated once per distinct (user, emotion) pair
+        users, user_codes = np.unique(np.asarray(user_ids, dtype=object), return_inverse=True)
+        pairs = user_codes.astype(np.int64) * k + dominant
+        allowed = np.zeros(n, dtype=bool)
+        candidates = np.flatnonzero(passes)
+        if len(self.cooldowns) + len(np.unique(user_codes[candidates])) > self.cooldowns.hard_max_users:
+            # The store may evict users mid-batch; touch in row order as get_nudge would
+            for row in candidates:
+                user, label = users[user_codes[row]], labels[dominant[row]]
+                if now - self.cooldowns.last(user, label) >= self.config.response_cooldown:
+                    allowed[row] = True
+                    self.cooldowns.touch(user, label, now)
+        elif len(candidates):
+            uniq, first = np.unique(pairs[candidates], return_index=True)
+            first_rows = candidates[first]
+            last = np.array([self.cooldowns.last(users[p // k], labels[p % k]) for p in uniq],
+                            dtype=np.float64)
+            eligible = now - last >= self.config.response_cooldown
+            if self.config.response_cooldown > 0:
+                # Within one batch only the first event of a pair can fire
+                allowed[first_rows[eligible]] = True
+            else:
+                allowed[candidates] = np.isin(pairs[candidates], uniq[eligible])
+            for p in uniq[eligible]:
+                self.cooldowns.touch(users[p // k], labels[p % k], now)
+
+        # Response selection stays sequential so RNG draws line up with get_nudge
+        neutral = self._responses['neutral']
+        pools = [self._responses.get(label, neutral) for label in labels]
+        choice = self._rng.choice
+        out = []
+        for row in range(n):
+            emotion = dominant[row]
+            response = choice(pools[emotion] if allowed[row] else neutral)
+            language = languages[row]
+            if language != 'en' and language in self.config.language_map:
+                lang_responses = self.config.language_map[language]
+                if labels[emotion] in lang_responses:
+                    response = choice(lang_responses[labels[emotion]])
+            out.append(response)
+        return out
+
+    @property
+    def last_response_time(self) -> Dict[str, Dict[str, float]]:
+        """Snapshot of tracked cooldowns as {user_id: {emotion: time}}"""
+        return self.cooldowns.snapshot()
+
+    def state_stats(self) -> Dict[str, int]:
+        """Tracked users, eviction counts and approximate memory of cooldown state"""
+        return self.cooldowns.stats()
+
     def _get_random_response(self, emotion: str) -> str:
         """Get random response for specified emotion"""
-        return random.choice(self._responses.get(emotion, self._responses['neutral']))
+        return self._rng.choice(self._responses.get(emotion, self._responses['neutral']))
 
     def add_custom_response(self, emotion: str, response: str):
         """Add custom response for an emotion"""
@@ -0,0 +1,138 @@
+import itertools
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+@dataclass
+class PlaybackPolicy:
+    max_queue: int = 4
+    coalesce_repeats: bool = True    # ignore an emotion that is already queued or just played
+    repeat_window: float = 10.0      # seconds a played emotion stays "just played"
+    drop_superseded: bool = True     # newer nudges replace queued ones of the same or lower priority
+    negative_priority: bool = True   # negative emotions jump ahead of the rest
+    negative_emotions: Tuple[str, ...] = ('sad', 'angry', 'fear', 'disgust')
+
+@dataclass(order=True)
+class QueuedNudge:
+    sort_key: Tuple[int, int]
+    emotion: str = field(compare=False)
+    payload: Any = field(compare=False)
+    enqueued_at: float = field(compare=False)
+
+class PlaybackQueue:
+    def __init__(self, play: Callable[[Any], None], policy: Optional[PlaybackPolicy] = None):
+        """Bounded queue drained by a single audio worker thread"""
+        self.play = play
+        self.policy = policy or PlaybackPolicy()
+        self._pending: List[QueuedNudge] = []
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self._playing: Optional[str] = None
+        self._last_played: Tuple[Optional[str], float] = (None, 0.0)
+        self._closed = False
+
+        self._counts = {'submitted': 0, 'played': 0, 'coalesced': 0,
+                        'superseded': 0, 'overflow': 0, 'errors': 0}
+        self._wait_times = deque(maxlen=256)
+        self._play_times = deque(maxlen=256)
+        self.last_error: Optional[str] = None
+
+        self._worker = threading.Thread(target=self._run, name="audio-playback", daemon=True)
+        self._worker.start()
+
+    def priority(self, emotion: str) -> int:
+        """Lower value plays first"""
+        if self.policy.negative_priority and emotion in self.policy.negative_emotions:
+            return 0
+        return 1
+
+    def submit(self, emotion: str, payload: Any) -> bool:
+        """Queue a nudge without waiting; returns False if the policy dropped it"""
+        now = time.time()
+        prio = self.priority(emotion)
+        with self._cond:
+            if self._closed:
+                return False
+            self._counts['submitted'] += 1
+
+            if self.policy.coalesce_repeats:
+                last_emotion, last_at = self._last_played
+                recently_played = emotion == last_emotion and now - last_at < self.policy.repeat_window
+                if (emotion == self._playing or recently_played
+                        or any(n.emotion == emotion for n in self._pending)):
+                    self._counts['coalesced'] += 1
+                    return False
+
+            if self.policy.drop_superseded:
+                kept = [n for n in self._pending if n.sort_key[0] < prio]
+                self._counts['superseded'] += len(self._pending) - len(kept)
+                self._pending = kept
+
+            if len(self._pending) >= self.policy.max_queue:
+                # Evict the least urgent, oldest entry; reject if the new one ranks lower
+                victim = max(self._pending, key=lambda n: (n.sort_key[0], -n.sort_key[1]))
+                if victim.sort_key[0] < prio:
+                    self._counts['overflow'] += 1
+                    return False
+                self._pending.remove(victim)
+                self._counts['overflow'] += 1
+
+            self._pending.append(QueuedNudge((prio, next(self._seq)), emotion, payload, now))
+            self._cond.notify()
+            return True
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending or self._closed)
+                if not self._pending:
+                    return
+                item = min(self._pending)
+                self._pending.remove(item)
+                self._playing = item.emotion
+
+            started = time.time()
+            try:
+                self.play(item.payload)
+            except Exception as e:
+                # Not counted as played, so the same emotion may be retried right away
+                with self._cond:
+                    self.last_error = str(e)
+                    self._playing = None
+                    self._counts['errors'] += 1
+                    self._wait_times.append(started - item.enqueued_at)
+                continue
+            finished = time.time()
+
+            with self._cond:
+                self._playing = None
+                self._last_played = (item.emotion, finished)
+                self._counts['played'] += 1
+                self._wait_times.append(started - item.enqueued_at)
+                self._play_times.append(finished - started)
+
+    @property
+    def depth(self) -> int:
+        with self._cond:
+            return len(self._pending)
+
+    def metrics(self) -> Dict[str, float]:
+        """Queue depth, drop counters and playback latency (seconds)"""
+        with self._cond:
+            waits = list(self._wait_times)
+            plays = list(self._play_times)
+            metrics = dict(self._counts)
+            metrics['depth'] = len(self._pending)
+        metrics['wait_avg'] = sum(waits) / len(waits) if waits else 0.0
+        metrics['wait_max'] = max(waits, default=0.0)
+        metrics['play_avg'] = sum(plays) / len(plays) if plays else 0.0
+        return metrics
+
+    def close(self, timeout: float = 1.0):
+        """Stop accepting nudges and let the worker exit once the queue drains"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._worker.join(timeout=timeout)
\ No newline at end of file
@@ -0,0 +1,133 @@
+import threading
+import time
+import weakref
+from typing import Dict, Optional
+
+import cv2
+import numpy as np
+
+from scene_gate import SceneChangeGate
+
+# Every live preview, so a process-wide bandwidth budget can be split between viewers
+_viewers: "weakref.WeakSet[PreviewStreamer]" = weakref.WeakSet()
+_viewers_lock = threading.Lock()
+
+class PreviewStreamer:
+    def __init__(self, width: int = 480, quality: int = 70, min_quality: int = 35,
+                 max_fps: float = 10.0, min_fps: float = 1.0, change_threshold: float = 1.5,
+                 refresh_every: int = 20, cpu_budget: float = 0.15,
+                 server_bandwidth: float = 8e6):
+        """Turn camera frames into a throttled stream of small JPEG previews
+
+        Frames are downscaled to `width` and JPEG-encoded at an adaptive
+        quality. Frames that have not visibly changed are skipped, apart
+        from a refresh every `refresh_every` previews. The preview rate
+        follows measured cost: encoding plus sending may use at most
+        `cpu_budget` of wall time. Quality drops when this viewer goes over
+        its share of `server_bandwidth` (bytes/s, split between all live
+        previews) and recovers slowly when it is back under.
+        """
+        self.width = width
+        self.max_quality = quality
+        self.min_quality = min(min_quality, quality)
+        self.quality = quality
+        self.max_fps = max_fps
+        self.min_fps = min_fps
+        self.cpu_budget = cpu_budget
+        self.server_bandwidth = server_bandwidth
+        self.gate = SceneChangeGate(change_threshold, refresh_every)
+        self.fps = max_fps
+        self._bandwidth_fps = max_fps  # rate cap once quality cannot drop further
+
+        self._small: Optional[np.ndarray] = None
+        self._bgr: Optional[np.ndarray] = None
+        self._next_due = 0.0
+        self._cost = 0.0        # EMA of encode + send seconds per preview
+        self._rate_bytes = 0.0  # EMA of bytes/s sent
+        self._last_sent = 0.0
+        self._pending_cost = 0.0
+        self.counts = {'offered': 0, 'sent': 0, 'skipped_rate': 0, 'skipped_static': 0, 'bytes': 0}
+        with _viewers_lock:
+            _viewers.add(self)
+
+    @staticmethod
+    def viewers() -> int:
+        with _viewers_lock:
+            return len(_viewers)
+
+    def _downscale(self, frame: np.ndarray, channels: str) -> np.ndarray:
+        h, w = frame.shape[:2]
+        width = min(self.width, w)
+        height = max(1, int(round(h * width / w)))
+        if self._small is None or self._small.shape[:2] != (height, width):
+            self._small = np.empty((height, width, 3), dtype=np.uint8)
+            self._bgr = np.empty_like(self._small)
+        cv2.resize(frame, (width, height), dst=self._small, interpolation=cv2.INTER_AREA)
+        if channels == 'RGB':
+            cv2.cvtColor(self._small, cv2.COLOR_RGB2BGR, dst=self._bgr)
+            return self._bgr
+        return self._small
+
+    def offer(self, frame: np.ndarray, channels: str = 'BGR') -> Optional[bytes]:
+        """JPEG bytes if this frame should be shown now, else None"""
+        self.counts['offered'] += 1
+        now = time.monotonic()
+        if now < self._next_due:
+            self.counts['skipped_rate'] += 1
+            return None
+        started = time.perf_counter()
+        small = self._downscale(frame, channels)
+        if not self.gate.check(small):
+            self.counts['skipped_static'] += 1
+            self._next_due = now + 1.0 / self.fps
+            return None
+        ok, encoded = cv2.imencode('.jpg', small, [cv2.IMWRITE_JPEG_QUALITY, int(self.quality)])
+        if not ok:
+            return None
+        self.gate.update(True)
+        data = encoded.tobytes()
+        self._pending_cost = time.perf_counter() - started
+        self._account(now, len(data))
+        return data
+
+    def sent(self, seconds: float):
+        """Report how long handing the preview to the client took"""
+        cost = self._pending_cost + seconds
+        self._cost = cost if not self._cost else 0.8 * self._cost + 0.2 * cost
+        # Stretch the interval so previews stay within the CPU budget
+        interval = max(1.0 / self.max_fps, self._cost / self.cpu_budget)
+        self.fps = max(self.min_fps, min(1.0 / interval, self._bandwidth_fps))
+        self._next_due = time.monotonic() + 1.0 / self.fps
+
+    def _account(self, now: float, size: int):
+        self.counts['sent'] += 1
+        self.counts['bytes'] += size
+        if self._last_sent:
+            rate = size / max(now - self._last_sent, 1e-3)
+            self._rate_bytes = rate if not self._rate_bytes else 0.8 * self._rate_bytes + 0.2 * rate
+        self._last_sent = now
+        share = self.server_bandwidth / max(1, self.viewers())
+        if self._rate_bytes > share:
+            self.quality = max(self.min_quality, self.quality - 5)
+            if self.quality == self.min_quality:
+                # Quality is exhausted; send less often instead
+                self._bandwidth_fps = max(self.min_fps, self.fps * share / self._rate_bytes)
+                self.fps = min(self.fps, self._bandwidth_fps)
+        elif self.quality < self.max_quality:
+            self.quality = min(self.max_quality, self.quality + 1)
+        else:
+            self._bandwidth_fps = min(self.max_fps, self._bandwidth_fps * 1.1)
+        self._next_due = now + 1.0 / self.fps
+
+    def stats(self) -> Dict[str, float]:
+        offered = self.counts['offered']
+        return dict(self.counts,
+                    fps=self.fps,
+                    quality=self.quality,
+                    kbps=self._rate_bytes * 8 / 1000,
+                    cost_ms=self._cost * 1000,
+                    send_ratio=self.counts['sent'] / offered if offered else 0.0)
+
+    def close(self):
+        with _viewers_lock:
+            _viewers.discard(self)
\ No newline at end of file
@@ -0,0 +1,74 @@
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+@dataclass
+class GovernorConfig:
+    active_fps: float = 10.0    # target rate while a face is in view
+    idle_fps: float = 1.0       # floor the rate decays to with nobody in view
+    idle_after: float = 3.0     # seconds without a face before backing off
+    backoff: float = 0.8        # rate multiplier per idle iteration
+    max_duty: float = 0.5       # cap on the share of wall time spent working
+
+class RateGovernor:
+    def __init__(self, config: Optional[GovernorConfig] = None):
+        """Pace a capture/inference loop by whether anyone is in view
+
+        The loop runs at `active_fps` while faces are seen. After `idle_after`
+        seconds without one the rate decays geometrically to `idle_fps`, and
+        the first face seen snaps it straight back. Independently, the sleep
+        is stretched so work never takes more than `max_duty` of wall time.
+        """
+        self.config = config or GovernorConfig()
+        self.target_fps = self.config.active_fps
+        self.state = 'active'
+        now = time.monotonic()
+        self._last_face = now
+        self._last_return: Optional[float] = None
+        self._effective_fps = 0.0
+        self._duty = 0.0
+        self.counts = {'iterations': 0, 'idle_iterations': 0, 'throttled': 0}
+
+    def pace(self, face_seen: bool) -> float:
+        """Sleep until the next iteration is due; returns the time slept
+
+        Call once per loop iteration after the frame has been handled. Work
+        time is measured from the previous return of pace().
+        """
+        cfg = self.config
+        now = time.monotonic()
+        busy = 0.0 if self._last_return is None else now - self._last_return
+
+        if face_seen:
+            self._last_face = now
+            self.target_fps = cfg.active_fps
+            self.state = 'active'
+        elif now - self._last_face >= cfg.idle_after:
+            self.target_fps = max(cfg.idle_fps, self.target_fps * cfg.backoff)
+            self.state = 'idle'
+            self.counts['idle_iterations'] += 1
+
+        interval = 1.0 / self.target_fps
+        if cfg.max_duty < 1.0 and busy > cfg.max_duty * interval:
+            interval = busy / cfg.max_duty
+            self.counts['throttled'] += 1
+        delay = max(0.0, interval - busy)
+        if delay:
+            time.sleep(delay)
+
+        done = time.monotonic()
+        if self._last_return is not None:
+            period = max(done - self._last_return, 1e-6)
+            self._effective_fps = 1.0 / period if not self._effective_fps else 0.8 * self._effective_fps + 0.2 / period
+            self._duty = 0.8 * self._duty + 0.2 * busy / period
+        self._last_return = done
+        self.counts['iterations'] += 1
+        return delay
+
+    def stats(self) -> Dict[str, float]:
+        return dict(self.counts,
+                    state=self.state,
+                    target_fps=self.target_fps,
+                    effective_fps=self._effective_fps,
+                    duty=self._duty,
+                    idle_for=max(0.0, time.monotonic() - self._last_face))
\ No newline at end of file
@@ -0,0 +1,205 @@
+import json
+import os
+import threading
+from array import array
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+RESOLUTIONS = {'minute': 60, 'hour': 3600, 'day': 86400}
+# How far back each histogram keeps buckets (seconds); None keeps everything
+DEFAULT_RETENTION = {'minute': 2 * 86400, 'hour': 90 * 86400, 'day': None}
+
+class _UserRollup:
+    __slots__ = ('counts', 'conf_sum', 'hist')
+
+    def __init__(self, width: int):
+        self.counts = array('q', [0] * width)
+        self.conf_sum = array('d', [0.0] * width)
+        # resolution -> {bucket index: per-emotion counts}; dicts keep insertion (time) order
+        self.hist: Dict[str, Dict[int, array]] = {res: {} for res in RESOLUTIONS}
+
+    def widen(self, width: int):
+        grow = width - len(self.counts)
+        if grow > 0:
+            self.counts.extend([0] * grow)
+            self.conf_sum.extend([0.0] * grow)
+            for buckets in self.hist.values():
+                for counts in buckets.values():
+                    counts.extend([0] * grow)
+
+class EmotionRollups:
+    def __init__(self, path: Optional[str] = None, retention: Optional[Dict[str, Optional[int]]] = None):
+        """Per-user emotion counts, mean confidence and time histograms, updated per event"""
+        self.path = path
+        self.retention = dict(DEFAULT_RETENTION, **(retention or {}))
+        self.emotions: List[str] = []
+        self._index: Dict[str, int] = {}
+        self._users: Dict[str, _UserRollup] = {}
+        self.rows_seen = 0
+        self._lock = threading.Lock()
+
+    def _emotion_index(self, emotion: str) -> int:
+        idx = self._index.get(emotion)
+        if idx is None:
+            idx = self._index[emotion] = len(self.emotions)
+            self.emotions.append(emotion)
+            for user in self._users.values():
+                user.widen(len(self.emotions))
+        return idx
+
+    def add(self, username: str, emotion: str, confidence: float, timestamp: float):
+        """Fold one logged event into the rollups; O(1)"""
+        with self._lock:
+            idx = self._emotion_index(emotion)
+            user = self._users.get(username)
+            if user is None:
+                user = self._users[username] = _UserRollup(len(self.emotions))
+            user.counts[idx] += 1
+            user.conf_sum[idx] += confidence
+            for res, width in RESOLUTIONS.items():
+                buckets = user.hist[res]
+                bucket = int(timestamp // width)
+                counts = buckets.get(bucket)
+                if counts is None:
+                    counts = buckets[bucket] = array('I', [0] * len(self.emotions))
+                    self._prune(buckets, bucket, res)
+                counts[idx] += 1
+            self.rows_seen += 1
+
+    def _prune(self, buckets: Dict[int, array], newest: int, res: str):
+        keep = self.retention.get(res)
+        if keep is None:
+            return
+        oldest = newest - keep // RESOLUTIONS[res]
+        while buckets:
+            first = next(iter(buckets))
+            if first >= oldest:
+                break
+            del buckets[first]
+
+    def add_rows(self, rows: Iterable[Dict[str, str]]):
+        """Fold raw DataLogger rows (ISO timestamps) into the rollups"""
+        for row in rows:
+            try:
+                ts = datetime.fromisoformat(row['timestamp']).timestamp()
+                conf = float(row.get('confidence') or 0)
+            except (KeyError, ValueError):
+                continue
+            self.add(row.get('username', ''), row.get('emotion', ''), conf, ts)
+
+    def drop_user(self, username: str):
+        with self._lock:
+            user = self._users.pop(username, None)
+            if user is not None:
+                self.rows_seen -= sum(user.counts)
+
+    def users(self) -> List[str]:
+        with self._lock:
+            return list(self._users)
+
+    def summary(self, username: str) -> Dict[str, Tuple[int, float]]:
+        """emotion -> (count, mean confidence) for one user"""
+        with self._lock:
+            user = self._users.get(username)
+            if user is None:
+                return {}
+            return {e: (user.counts[i], user.conf_sum[i] / user.counts[i])
+                    for i, e in enumerate(self.emotions) if user.counts[i]}
+
+    def counts_matrix(self, users: Optional[List[str]] = None) -> Tuple[List[str], List[str], np.ndarray, np.ndarray]:
+        """Return (users, emotions, counts[U, K], mean_confidence[U, K])"""
+        with self._lock:
+            users = list(self._users) if users is None else users
+            k = len(self.emotions)
+            counts = np.zeros((len(users), k), dtype=np.int64)
+            conf = np.zeros((len(users), k), dtype=np.float64)
+            for row, name in enumerate(users):
+                user = self._users.get(name)
+                if user is not None:
+                    counts[row] = np.frombuffer(user.counts, dtype=np.int64)
+                    conf[row] = np.frombuffer(user.conf_sum, dtype=np.float64)
+            emotions = list(self.emotions)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(counts > 0, conf / np.maximum(counts, 1), 0.0)
+        return users, emotions, counts, mean
+
+    def histogram(self, username: str, resolution: str = 'hour',
+                  start: Optional[float] = None, end: Optional[float] = None,
+                  dense: bool = True) -> Tuple[np.ndarray, List[str], np.ndarray]:
+        """Return (bucket start times as datetime64[s], emotions, counts[B, K]) for epoch range [start, end)"""
+        width = RESOLUTIONS[resolution]
+        with self._lock:
+            emotions = list(self.emotions)
+            user = self._users.get(username)
+            buckets = dict(user.hist[resolution]) if user is not None else {}
+            lo = None if start is None else int(start // width)
+            hi = None if end is None else int(-(-end // width))
+            keys = sorted(b for b in buckets if (lo is None or b >= lo) and (hi is None or b < hi))
+            if dense and keys:
+                first = keys[0] if lo is None else lo
+                last = keys[-1] + 1 if hi is None else hi
+                index = np.arange(first, last, dtype=np.int64)
+                counts = np.zeros((len(index), len(emotions)), dtype=np.int64)
+                for b in keys:
+                    counts[b - first, :len(buckets[b])] = buckets[b]
+            else:
+                index = np.array(keys, dtype=np.int64)
+                counts = np.zeros((len(keys), len(emotions)), dtype=np.int64)
+                for row, b in enumerate(keys):
+                    counts[row, :len(buckets[b])] = buckets[b]
+        return (index * width).astype('datetime64[s]'), emotions, counts
+
+    def to_dataframe(self, username: str, resolution: str = 'hour', **kwargs):
+        """Histogram as a pandas DataFrame indexed by bucket start"""
+        import pandas as pd
+        times, emotions, counts = self.histogram(username, resolution, **kwargs)
+        return pd.DataFrame(counts, index=pd.DatetimeIndex(times, name='bucket'), columns=emotions)
+
+    def save(self, path: Optional[str] = None):
+        """Write a compact JSON snapshot"""
+        path = path or self.path
+        if path is None:
+            return
+        with self._lock:
+            snapshot = {
+                'rows_seen': self.rows_seen,
+                'emotions': self.emotions,
+                'users': {
+                    name: {
+                        'counts': user.counts.tolist(),
+                        'conf_sum': user.conf_sum.tolist(),
+                        'hist': {res: [[b, c.tolist()] for b, c in buckets.items()]
+                                 for res, buckets in user.hist.items()},
+                    } for name, user in self._users.items()
+                },
+            }
+        tmp = f"{path}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(snapshot, f, separators=(',', ':'))
+        os.replace(tmp, path)
+
+    def load(self, path: Optional[str] = None) -> bool:
+        """Restore a snapshot written by save(); False if there is none"""
+        path = path or self.path
+        try:
+            with open(path) as f:
+                snapshot = json.load(f)
+        except (TypeError, FileNotFoundError, ValueError):
+            return False
+        with self._lock:
+            self.emotions = list(snapshot['emotions'])
+            self._index = {e: i for i, e in enumerate(self.emotions)}
+            width = len(self.emotions)
+            self._users = {}
+            for name, data in snapshot['users'].items():
+                user = _UserRollup(width)
+                user.counts = array('q', data['counts'])
+                user.conf_sum = array('d', data['conf_sum'])
+                user.hist = {res: {b: array('I', c) for b, c in data['hist'].get(res, [])}
+                             for res in RESOLUTIONS}
+                user.widen(width)
+                self._users[name] = user
+            self.rows_seen = snapshot['rows_seen']
+        return True
\ No newline at end of file
@@ -1,23 +1,19 @@
-from gtts import gTTS
-import tempfile
-import playsound
-import os
+from audio_playback import PlaybackEngine, get_default_engine
 
 class SpeechTranslator:
-    def __init__(self):
-        pass  # No initialization needed for gTTS
+    def __init__(self, engine: PlaybackEngine = None):
+        self.engine = engine or get_default_engine()
     
     def translate(self, text, target_language):
         # Add translation logic if needed
         return text
     
+    def prewarm(self, phrases):
+        """Cache and decode audio for (text, language) pairs ahead of first use"""
+        return self.engine.prewarm(phrases, slow=False)
+    
     def text_to_speech(self, text, language='en'):
         try:
-            tts = gTTS(text=text, lang=language, slow=False)
-            with tempfile.NamedTemporaryFile(delete=True, suffix='.mp3') as fp:
-                temp_filename = f"{fp.name}.mp3"
-                tts.save(temp_filename)
-                playsound.playsound(temp_filename)
-                os.remove(temp_filename)
+            self.engine.play(text, language, slow=False)
         except Exception as e:
             raise Exception(f"TTS Error: {str(e)}")
\ No newline at end of file
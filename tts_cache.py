@@ -0,0 +1,176 @@
+import hashlib
+import io
+import json
+import math
+import os
+import struct
+import threading
+import wave
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, Tuple
+
+from metrics import metrics
+
+class GTTSSynthesizer:
+    """Google TTS backend (needs network)"""
+    name = "gtts"
+    suffix = ".mp3"
+
+    def synthesize(self, text: str, lang: str = 'en', **params) -> bytes:
+        from gtts import gTTS
+        buf = io.BytesIO()
+        gTTS(text=text, lang=lang, slow=params.get('slow', False)).write_to_fp(buf)
+        return buf.getvalue()
+
+class StubSynthesizer:
+    """Offline stand-in for gTTS: a short tone whose length follows the text"""
+    name = "stub"
+    suffix = ".wav"
+
+    def __init__(self, sample_rate: int = 16000, seconds_per_char: float = 0.02):
+        self.sample_rate = sample_rate
+        self.seconds_per_char = seconds_per_char
+
+    def synthesize(self, text: str, lang: str = 'en', **params) -> bytes:
+        n = int(self.sample_rate * min(max(len(text) * self.seconds_per_char, 0.1), 5.0))
+        freq = 220 + (sum(map(ord, text)) % 440)
+        samples = struct.pack(
+            f"<{n}h",
+            *(int(3000 * math.sin(2 * math.pi * freq * i / self.sample_rate)) for i in range(n)))
+        buf = io.BytesIO()
+        with wave.open(buf, 'wb') as w:
+            w.setnchannels(1)
+            w.setsampwidth(2)
+            w.setframerate(self.sample_rate)
+            w.writeframes(samples)
+        return buf.getvalue()
+
+class TTSCache:
+    def __init__(self, synthesizer=None,
+                 cache_dir: str = "data/tts_cache",
+                 max_memory_bytes: int = 32 * 1024 * 1024,
+                 max_disk_bytes: int = 256 * 1024 * 1024):
+        """Two-tier audio cache: in-memory LRU backed by an on-disk store"""
+        self.synthesizer = synthesizer or GTTSSynthesizer()
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_bytes = sum(p.stat().st_size for p in self._disk_files())
+        self._lock = threading.Lock()
+        self.hits = {'memory': 0, 'disk': 0}
+        self.misses = 0
+
+    def key(self, text: str, lang: str = 'en', **params) -> str:
+        """Content address for a (text, lang, voice params) triple"""
+        payload = json.dumps([self.synthesizer.name, text, lang, sorted(params.items())],
+                             ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, text: str, lang: str = 'en', **params) -> bytes:
+        """Return audio bytes, synthesizing only on a full miss"""
+        return self._lookup(self.key(text, lang, **params), text, lang, params)[0]
+
+    def prewarm(self, phrases: Iterable[Tuple[str, str]], **params) -> int:
+        """Synthesize every (text, lang) phrase not already cached; returns how many were new"""
+        created = 0
+        for text, lang in phrases:
+            try:
+                _, tier = self._lookup(self.key(text, lang, **params), text, lang, params)
+                created += tier == 'synth'
+            except Exception as e:
+                print(f"TTS prewarm error ({lang}): {e}")
+        return created
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'memory_hits': self.hits['memory'],
+                'disk_hits': self.hits['disk'],
+                'misses': self.misses,
+                'memory_entries': len(self._memory),
+                'memory_bytes': self._memory_bytes,
+                'disk_bytes': self._disk_bytes,
+            }
+
+    def _lookup(self, key: str, text: str, lang: str, params: dict) -> Tuple[bytes, str]:
+        with self._lock:
+            audio = self._memory.get(key)
+            if audio is not None:
+                self._memory.move_to_end(key)
+                self.hits['memory'] += 1
+                return audio, 'memory'
+
+        path = self._disk_path(key)
+        try:
+            audio = path.read_bytes()
+            os.utime(path)  # keep recently used files away from eviction
+            tier = 'disk'
+        except FileNotFoundError:
+            with metrics.timer('tts_synthesis'):
+                audio = self.synthesizer.synthesize(text, lang, **params)
+            self._write_disk(key, audio)
+            tier = 'synth'
+
+        with self._lock:
+            if tier == 'disk':
+                self.hits['disk'] += 1
+            else:
+                self.misses += 1
+            self._remember(key, audio)
+        return audio, tier
+
+    def _remember(self, key: str, audio: bytes):
+        """Insert into the memory tier, evicting least recently used entries"""
+        if len(audio) > self.max_memory_bytes:
+            return
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= len(old)
+        self._memory[key] = audio
+        self._memory_bytes += len(audio)
+        while self._memory_bytes > self.max_memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    def _disk_path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}{self.synthesizer.suffix}"
+
+    def _disk_files(self):
+        return [p for p in self.cache_dir.iterdir() if p.is_file() and not p.name.endswith('.tmp')]
+
+    def _write_disk(self, key: str, audio: bytes):
+        """Atomically store audio on disk and trim the store to its size limit"""
+        path = self._disk_path(key)
+        tmp = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(audio)
+        replaced = path.stat().st_size if path.exists() else 0
+        os.replace(tmp, path)
+        with self._lock:
+            self._disk_bytes += len(audio) - replaced
+            if self._disk_bytes <= self.max_disk_bytes:
+                return
+            files = sorted(self._disk_files(), key=lambda p: p.stat().st_mtime)
+            self._disk_bytes = sum(p.stat().st_size for p in files)
+            for old in files:
+                if self._disk_bytes <= self.max_disk_bytes:
+                    break
+                if old == path:
+                    continue
+                self._disk_bytes -= old.stat().st_size
+                old.unlink(missing_ok=True)
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+def get_default_cache() -> TTSCache:
+    """Process-wide cache shared by the speaker and translator"""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = TTSCache()
+        return _default_cache
\ No newline at end of file
@@ -0,0 +1,226 @@
+import json
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to in-process locking only
+    fcntl = None
+
+class UserStore:
+    def __init__(self, path: str = "data/users.json", compact_every: int = 1000):
+        """In-memory user index over a JSON snapshot plus an append-only journal
+
+        Lookups are dict hits after a cheap stat() check; writes append one
+        fsync'd journal line under a file lock, so concurrent sessions (threads
+        or processes) never lose each other's registrations. Each journal
+        starts with a generation line; compaction swaps in a new journal with
+        a new generation, so a reader holding an offset into the old one
+        reloads instead of seeking into the new one.
+        """
+        self.path = Path(path)
+        self.journal_path = self.path.with_suffix('.journal')
+        self.lock_path = self.path.with_suffix('.lock')
+        self.compact_every = compact_every
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._users: Dict[str, Dict[str, Any]] = {}
+        self._snapshot_sig: Optional[Tuple[int, int, int]] = None
+        self._journal_sig: Optional[Tuple[int, int, int]] = None
+        self._journal_generation: Optional[str] = None
+        self._journal_offset = 0
+        self._journal_entries = 0
+        self._lock = threading.RLock()
+        self.reloads = 0
+        self.refresh()
+
+    @staticmethod
+    def _signature(path: Path) -> Optional[Tuple[int, int, int]]:
+        try:
+            st = path.stat()
+            return st.st_mtime_ns, st.st_size, st.st_ino
+        except FileNotFoundError:
+            return None
+
+    def refresh(self):
+        """Pick up changes made by other processes; cheap when nothing changed"""
+        with self._lock:
+            snapshot_sig = self._signature(self.path)
+            journal_sig = self._signature(self.journal_path)
+            if snapshot_sig != self._snapshot_sig:
+                self._load_snapshot()
+                self._snapshot_sig = snapshot_sig
+                self._reset_journal()
+                self._journal_sig = None
+            if journal_sig != self._journal_sig:
+                if journal_sig is None or journal_sig[1] < self._journal_offset:
+                    # Journal was truncated by a compaction we have not seen yet
+                    self._load_snapshot()
+                    self._reset_journal()
+                self._replay_journal()
+                self._journal_sig = journal_sig
+
+    def _load_snapshot(self):
+        try:
+            with open(self.path) as f:
+                self._users = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self._users = {}
+        self.reloads += 1
+
+    def _reset_journal(self):
+        self._journal_offset = 0
+        self._journal_entries = 0
+        self._journal_generation = None
+
+    @staticmethod
+    def _generation_of(line: bytes) -> Optional[str]:
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            return None
+        return entry.get('id') if isinstance(entry, dict) and entry.get('op') == 'generation' else None
+
+    def _replay_journal(self):
+        """Apply journal lines appended since the last replay"""
+        try:
+            with open(self.journal_path, 'rb') as f:
+                if self._journal_offset and self._generation_of(f.readline()) != self._journal_generation:
+                    # A compaction replaced the journal; our offset belongs to the old one
+                    self._load_snapshot()
+                    self._reset_journal()
+                f.seek(self._journal_offset)
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break  # partially written entry; pick it up next time
+                    self._journal_offset += len(line)
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    if entry.get('op') == 'generation':
+                        self._journal_generation = entry.get('id')
+                        continue
+                    self._journal_entries += 1
+                    if entry.get('op') == 'put':
+                        self._users[entry['user']] = entry['record']
+                    elif entry.get('op') == 'delete':
+                        self._users.pop(entry['user'], None)
+        except FileNotFoundError:
+            pass
+
+    @contextmanager
+    def _write_lock(self):
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self.lock_path, 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _generation_line() -> Tuple[str, bytes]:
+        generation = os.urandom(8).hex()
+        return generation, (json.dumps({'op': 'generation', 'id': generation}) + '\n').encode('utf-8')
+
+    def _append(self, entry: Dict[str, Any]):
+        line = (json.dumps(entry, separators=(',', ':')) + '\n').encode('utf-8')
+        if self._journal_offset == 0:
+            # First entry of a missing or empty journal: give it a generation
+            self._journal_generation, header = self._generation_line()
+            line = header + line
+        with open(self.journal_path, 'ab') as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+        self._journal_offset += len(line)
+        self._journal_entries += 1
+        self._journal_sig = self._signature(self.journal_path)
+
+    def get(self, username: str) -> Optional[Dict[str, Any]]:
+        self.refresh()
+        return self._users.get(username)
+
+    def __contains__(self, username: str) -> bool:
+        return self.get(username) is not None
+
+    def __len__(self) -> int:
+        self.refresh()
+        return len(self._users)
+
+    def all(self) -> Dict[str, Dict[str, Any]]:
+        """Copy of every user record"""
+        self.refresh()
+        with self._lock:
+            return dict(self._users)
+
+    def add(self, username: str, record: Dict[str, Any]) -> bool:
+        """Create a user atomically; False if the name is already taken"""
+        with self._write_lock():
+            self.refresh()
+            if username in self._users:
+                return False
+            self._append({'op': 'put', 'user': username, 'record': record})
+            self._users[username] = record
+            if self._journal_entries >= self.compact_every:
+                self._write_snapshot()
+            return True
+
+    def put(self, username: str, record: Dict[str, Any]):
+        """Create or overwrite a user record"""
+        with self._write_lock():
+            self.refresh()
+            self._append({'op': 'put', 'user': username, 'record': record})
+            self._users[username] = record
+
+    def replace_all(self, users: Dict[str, Dict[str, Any]]):
+        """Atomically replace every record (compatibility with whole-file saves)"""
+        with self._write_lock():
+            self._users = dict(users)
+            self._write_snapshot()
+
+    def compact(self):
+        """Fold the journal into the snapshot"""
+        with self._write_lock():
+            self.refresh()
+            self._write_snapshot()
+
+    def _write_snapshot(self):
+        tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        with open(tmp, 'w') as f:
+            json.dump(self._users, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        # Entries are now in the snapshot; swap in a fresh journal under a new
+        # generation (never truncate in place: readers track offsets into it)
+        generation, header = self._generation_line()
+        tmp = self.journal_path.with_name(f"{self.journal_path.name}.{os.getpid()}.tmp")
+        with open(tmp, 'wb') as f:
+            f.write(header)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.journal_path)
+        self._snapshot_sig = self._signature(self.path)
+        self._journal_sig = self._signature(self.journal_path)
+        self._journal_offset = len(header)
+        self._journal_entries = 0
+        self._journal_generation = generation
+
+_default_store = None
+_default_lock = threading.Lock()
+
+def get_user_store(path: str = "data/users.json") -> UserStore:
+    """Process-wide store shared by all Streamlit sessions"""
+    global _default_store
+    with _default_lock:
+        if _default_store is None or str(_default_store.path) != str(Path(path)):
+            _default_store = UserStore(path)
+        return _default_store
\ No newline at end of file